@@ -0,0 +1,474 @@
+# _sim_kernel.py
+# Numba-compiled Poisson game kernels and the stat blend (optional — callers fall back to NumPy without numba)
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        """No-op stand-in for numba.njit so this module still imports."""
+        if args and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+# fastmath without the no-NaN/no-Inf assumptions, since normal_cutoff may be inf
+_FASTMATH = {"nsz", "arcp", "contract", "afn", "reassoc"}
+
+
+# Below this xG, Poisson draws use CDF inversion (one uniform) instead of numba's
+# multiplication method (about lam + 1 uniforms); measured ~2x faster for hockey xG
+_INVERSION_MAX_LAM = 10.0
+
+
+@njit(cache=True, fastmath=_FASTMATH)
+def _poisson_draw(lam, normal_cutoff):
+    """
+    Poisson draw that switches to a rounded normal approximation once lam >= normal_cutoff.
+    """
+    if lam >= normal_cutoff:
+        x = lam + np.sqrt(lam) * np.random.standard_normal()
+        return 0 if x < 0.5 else int(x + 0.5)
+    if lam < _INVERSION_MAX_LAM:
+        # Sequential search up the CDF; p reaching 0 stops a u that rounding left above it
+        u = np.random.random()
+        p = np.exp(-lam)
+        cdf = p
+        k = 0
+        while u > cdf and p > 0.0:
+            k += 1
+            p *= lam / k
+            cdf += p
+        return k
+    return np.random.poisson(lam)
+
+
+@njit(cache=True, fastmath=True)
+def simulate_matchup_batch(ho, hd, ao, ad, n, variance, home_ice, league_xg, ot_p, seed):
+    """
+    Simulate one matchup n times without allocating per-simulation arrays.
+
+    Args:
+        ho, hd (float): Home offensive / defensive rating
+        ao, ad (float): Away offensive / defensive rating
+        n (int): Number of simulations
+        variance (float): Game-to-game strength variance (uniform ± fraction)
+        home_ice (float): Home ice xG multiplier
+        league_xg (float): League average xG per 60
+        ot_p (float): Probability the home team wins a tied game in OT/SO
+        seed (int): Seed for numba's generator
+
+    Returns:
+        tuple: (home_wins, home_goals_total, away_goals_total)
+    """
+    np.random.seed(seed)
+    low = 1.0 - variance
+    span = 2.0 * variance
+
+    home_wins = 0
+    hg_sum = 0
+    ag_sum = 0
+    for _ in range(n):
+        h_off, h_def, a_off, a_def = ho, hd, ao, ad
+        if variance > 0:
+            h_off *= low + span * np.random.random()
+            h_def *= low + span * np.random.random()
+            a_off *= low + span * np.random.random()
+            a_def *= low + span * np.random.random()
+
+        hg = _poisson_draw(h_off * home_ice * (league_xg / a_def), np.inf)
+        ag = _poisson_draw(a_off * (league_xg / h_def), np.inf)
+
+        if hg > ag:
+            home_wins += 1
+        elif hg == ag:
+            # Overtime/Shootout
+            if np.random.random() < ot_p:
+                home_wins += 1
+                hg += 1
+            else:
+                ag += 1
+
+        hg_sum += hg
+        ag_sum += ag
+
+    return home_wins, hg_sum, ag_sum
+
+
+# Games per reseed in simulate_season_games: fixed, so chunking never follows the thread count
+_GAME_CHUNK = 1024
+
+
+@njit(cache=True, fastmath=_FASTMATH, parallel=True)
+def simulate_season_games(home_xg, away_xg, ot_p, seed, normal_cutoff=np.inf):
+    """
+    Simulate a slate of independent games, one per xG pair, across all cores.
+
+    Games run in fixed chunks of _GAME_CHUNK, and each chunk reseeds the generator
+    of whichever thread runs it from (seed, chunk), so results don't depend on the
+    thread count.
+
+    Args:
+        home_xg (np.ndarray): Home expected goals per game
+        away_xg (np.ndarray): Away expected goals per game
+        ot_p (float): Probability the home team wins a tied game in OT/SO
+        seed (int): Base seed for numba's generator
+        normal_cutoff (float): Use the normal approximation for xG at or above this (inf = exact)
+
+    Returns:
+        tuple: (home_goals, away_goals, regulation) arrays; goals include the OT/SO winner's goal
+    """
+    n_games = home_xg.shape[0]
+    hgs = np.empty(n_games, dtype=np.int64)
+    ags = np.empty(n_games, dtype=np.int64)
+    regulation = np.empty(n_games, dtype=np.bool_)
+
+    n_chunks = (n_games + _GAME_CHUNK - 1) // _GAME_CHUNK
+    for c in prange(n_chunks):
+        # Golden-ratio stride keeps neighbouring chunk seeds far apart
+        np.random.seed((seed + c * 0x9E3779B9) & 0xFFFFFFFF)
+        for g in range(c * _GAME_CHUNK, min((c + 1) * _GAME_CHUNK, n_games)):
+            hg = _poisson_draw(home_xg[g], normal_cutoff)
+            ag = _poisson_draw(away_xg[g], normal_cutoff)
+            regulation[g] = hg != ag
+            if hg == ag:
+                if np.random.random() < ot_p:
+                    hg += 1
+                else:
+                    ag += 1
+            hgs[g] = hg
+            ags[g] = ag
+
+    return hgs, ags, regulation
+
+
+@njit(cache=True, fastmath=True)
+def simulate_game_nb(h, a, off, def_, variance, home_ice, league_xg, ot_p):
+    """
+    Numeric simulate_game: teams are integer indices into the rating arrays.
+
+    Draws from numba's generator, so callers seed it (see best_of_7_nb).
+
+    Args:
+        h, a (int): Home / away team index
+        off, def_ (np.ndarray): Offensive / defensive ratings by team index
+        variance (float): Game-to-game strength variance (uniform ± fraction)
+        home_ice (float): Home ice xG multiplier
+        league_xg (float): League average xG per 60
+        ot_p (float): Probability the home team wins a tied game in OT/SO
+
+    Returns:
+        tuple: (winner_idx, home_pts, away_pts, home_goals, away_goals, regulation_win)
+    """
+    ho, hd, ao, ad = off[h], def_[h], off[a], def_[a]
+    if variance > 0:
+        low = 1.0 - variance
+        span = 2.0 * variance
+        ho *= low + span * np.random.random()
+        hd *= low + span * np.random.random()
+        ao *= low + span * np.random.random()
+        ad *= low + span * np.random.random()
+
+    hg = _poisson_draw(ho * home_ice * (league_xg / ad), np.inf)
+    ag = _poisson_draw(ao * (league_xg / hd), np.inf)
+
+    if hg > ag:
+        return h, 2, 0, hg, ag, True
+    elif ag > hg:
+        return a, 0, 2, hg, ag, True
+    # Overtime/Shootout
+    if np.random.random() < ot_p:
+        return h, 2, 1, hg + 1, ag, False
+    return a, 1, 2, hg, ag + 1, False
+
+
+@njit(cache=True, fastmath=True)
+def _series(t1, t2, home_first, off, def_, variance, home_ice, league_xg, ot_p):
+    """
+    Play a best-of-7 on numba's (already seeded) generator; returns the winning index.
+    """
+    wins1 = wins2 = 0
+    home_turn = home_first
+    while wins1 < 4 and wins2 < 4:
+        if home_turn:
+            winner = simulate_game_nb(t1, t2, off, def_, variance, home_ice, league_xg, ot_p)[0]
+        else:
+            winner = simulate_game_nb(t2, t1, off, def_, variance, home_ice, league_xg, ot_p)[0]
+        if winner == t1:
+            wins1 += 1
+        else:
+            wins2 += 1
+        home_turn = not home_turn
+    return t1 if wins1 == 4 else t2
+
+
+@njit(cache=True, fastmath=True)
+def best_of_7_nb(t1, t2, home_first, off, def_, variance, home_ice, league_xg, ot_p, seed):
+    """
+    Numeric best_of_7: alternate home ice until one side has four wins.
+
+    Args:
+        t1, t2 (int): Team indices (t1 typically the higher seed)
+        home_first (bool): Whether t1 hosts game 1
+        off, def_ (np.ndarray): Offensive / defensive ratings by team index
+        variance, home_ice, league_xg, ot_p (float): As in simulate_game_nb
+        seed (int): Seed for numba's generator
+
+    Returns:
+        int: Winning team index
+    """
+    np.random.seed(seed)
+    return _series(t1, t2, home_first, off, def_, variance, home_ice, league_xg, ot_p)
+
+
+@njit(cache=True, fastmath=True)
+def _conference_bracket(field, rounds, off, def_, variance, home_ice, league_xg, ot_p):
+    """
+    Play one conference's three rounds on numba's (already seeded) generator.
+
+    Adjacent seeds meet each round, the higher seed hosting; an odd field gives
+    the last seed a bye.
+
+    Args:
+        field (np.ndarray): Conference playoff team indices, best seed first
+        rounds (np.ndarray): (3, len(field)) output, filled with -1 by the caller;
+            row r receives the round r winners in bracket order
+        off, def_ (np.ndarray): Offensive / defensive ratings by team index
+        variance, home_ice, league_xg, ot_p (float): As in simulate_game_nb
+
+    Returns:
+        int: Conference champion index, or -1 if the field was empty
+    """
+    for rnd in range(3):
+        m = field.shape[0]
+        if m >= 2:
+            winners = np.empty((m + 1) // 2, dtype=np.int64)
+            for i in range(0, m - 1, 2):
+                winners[i // 2] = _series(field[i], field[i + 1], True, off, def_, variance, home_ice,
+                                          league_xg, ot_p)
+            if m % 2:
+                winners[-1] = field[-1]  # odd field: last seed gets a bye
+            field = winners
+            rounds[rnd, :field.shape[0]] = field
+        elif m == 1 and rnd == 2:
+            rounds[rnd, 0] = field[0]
+    return field[0] if field.shape[0] == 1 else -1
+
+
+@njit(cache=True, fastmath=True)
+def bracket_nb(east, west, rank, off, def_, variance, home_ice, league_xg, ot_p, seed):
+    """
+    Numeric simulate_bracket: both conferences and the Cup Final in one call.
+
+    Args:
+        east, west (np.ndarray): Conference playoff team indices, best seed first
+        rank (np.ndarray): League rank by team index (lower = better; decides Final home ice)
+        off, def_ (np.ndarray): Offensive / defensive ratings by team index
+        variance, home_ice, league_xg, ot_p (float): As in simulate_game_nb
+        seed (int): Seed for numba's generator
+
+    Returns:
+        tuple: (east_rounds, west_rounds, cup_winner); rounds as in _conference_bracket,
+            cup_winner is -1 without two conference champions
+    """
+    np.random.seed(seed)
+    east_rounds = np.full((3, east.shape[0]), -1, dtype=np.int64)
+    west_rounds = np.full((3, west.shape[0]), -1, dtype=np.int64)
+    east_champ = _conference_bracket(east, east_rounds, off, def_, variance, home_ice, league_xg, ot_p)
+    west_champ = _conference_bracket(west, west_rounds, off, def_, variance, home_ice, league_xg, ot_p)
+    cup = -1
+    if east_champ >= 0 and west_champ >= 0:
+        cup = _series(east_champ, west_champ, rank[east_champ] < rank[west_champ], off, def_, variance,
+                      home_ice, league_xg, ot_p)
+    return east_rounds, west_rounds, cup
+
+
+@njit(cache=True, fastmath=_FASTMATH)
+def _play_season(totals, strength_off, strength_def, home_idx, away_idx, variance, home_ice, league_xg, ot_p,
+                 normal_cutoff):
+    """
+    Play every remaining game once, adding points, ROW, OTW, GF, GA into totals (n_teams, 5).
+    """
+    low = 1.0 - variance
+    span = 2.0 * variance
+    for g in range(home_idx.shape[0]):
+        h = home_idx[g]
+        a = away_idx[g]
+        h_off, h_def = strength_off[h], strength_def[h]
+        a_off, a_def = strength_off[a], strength_def[a]
+        if variance > 0:
+            h_off *= low + span * np.random.random()
+            h_def *= low + span * np.random.random()
+            a_off *= low + span * np.random.random()
+            a_def *= low + span * np.random.random()
+
+        hg = _poisson_draw(h_off * home_ice * (league_xg / a_def), normal_cutoff)
+        ag = _poisson_draw(a_off * (league_xg / h_def), normal_cutoff)
+
+        if hg != ag:
+            winner = h if hg > ag else a
+            totals[winner, 0] += 2
+            totals[winner, 1] += 1
+        else:
+            # Overtime/Shootout: loser keeps a point, winner's goal counts
+            if np.random.random() < ot_p:
+                winner, loser = h, a
+                hg += 1
+            else:
+                winner, loser = a, h
+                ag += 1
+            totals[winner, 0] += 2
+            totals[winner, 2] += 1
+            totals[loser, 0] += 1
+
+        totals[h, 3] += hg
+        totals[h, 4] += ag
+        totals[a, 3] += ag
+        totals[a, 4] += hg
+
+
+@njit(cache=True)
+def rank_teams(totals):
+    """
+    League order by points, ROW, OTW, GF-GA, GF (all descending), ties kept in index order.
+
+    All five tiebreakers are packed into one int64 key (GF < 1024, |GF-GA| < 1024,
+    ROW/OTW < 128 per season) so the ranking is a single stable argsort.
+
+    Args:
+        totals (np.ndarray): (n_teams, 5) points, ROW, OTW, GF, GA
+
+    Returns:
+        np.ndarray: Team indices, best first
+    """
+    points = totals[:, 0].astype(np.int64)
+    row = totals[:, 1].astype(np.int64)
+    otw = totals[:, 2].astype(np.int64)
+    gf = totals[:, 3].astype(np.int64)
+    diff = gf - totals[:, 4].astype(np.int64) + 1024
+    key = (((points * 128 + row) * 128 + otw) * 2048 + diff) * 1024 + gf
+    return np.argsort(-key, kind="mergesort")
+
+
+@njit(cache=True)
+def qualify_playoffs(order, div_idx):
+    """
+    Top 3 per division, then the best two remaining per conference, walking the league order.
+
+    Args:
+        order (np.ndarray): Team indices, best first (see rank_teams)
+        div_idx (np.ndarray): Division of each team (0-1 East, 2-3 West, -1 = no division)
+
+    Returns:
+        np.ndarray: Boolean playoff mask by team index
+    """
+    div_count = np.zeros(4, dtype=np.int64)
+    wildcards = np.zeros(2, dtype=np.int64)
+    qualified = np.zeros(order.shape[0], dtype=np.bool_)
+    for t in order:
+        d = div_idx[t]
+        if d >= 0 and div_count[d] < 3:
+            qualified[t] = True
+            div_count[d] += 1
+    for t in order:
+        d = div_idx[t]
+        if d >= 0 and not qualified[t] and wildcards[d // 2] < 2:
+            qualified[t] = True
+            wildcards[d // 2] += 1
+    return qualified
+
+
+@njit(cache=True, fastmath=_FASTMATH, parallel=True)
+def run_all_sims(base, strength_off, strength_def, home_idx, away_idx, div_idx, n_sims, variance, home_ice,
+                 league_xg, ot_p, seeds, normal_cutoff=np.inf):
+    """
+    Full Monte Carlo in one parallel kernel: season, ranking, qualification and bracket per simulation.
+
+    Mirrors the Python path: top 3 per division plus two wildcards per conference,
+    each conference bracket pairs adjacent seeds, and the better-ranked conference
+    champion hosts the Cup Final. Each simulation reseeds from its own seed, so a run
+    is reproducible from the seeds alone.
+
+    Args:
+        base (np.ndarray): (n_teams, 5) current points, ROW, OTW, GF, GA
+        strength_off, strength_def (np.ndarray): Team ratings in team-index order
+        home_idx, away_idx (np.ndarray): Team index of each remaining game's home / away side
+        div_idx (np.ndarray): Division of each team (0-1 East, 2-3 West, -1 = no division)
+        n_sims (int): Number of seasons to simulate
+        variance, home_ice, league_xg, ot_p (float): As in simulate_game_nb
+        seeds (np.ndarray): One uint32 seed per simulation; each sim reseeds the generator of
+            whichever thread runs it, so results don't depend on the thread count
+        normal_cutoff (float): Use the normal approximation for xG at or above this (inf = exact)
+
+    Returns:
+        np.ndarray: (6, n_teams) counts; rows are playoff, round1, round2, conf_finals, cup, pres
+    """
+    n_teams = base.shape[0]
+    hits = np.zeros((n_sims, 6, n_teams), dtype=np.int8)
+
+    for s in prange(n_sims):
+        np.random.seed(seeds[s])
+        totals = base.copy()
+        _play_season(totals, strength_off, strength_def, home_idx, away_idx, variance, home_ice, league_xg,
+                     ot_p, normal_cutoff)
+        # One ranking pass; order and rank feed qualification, seeding and home ice
+        order = rank_teams(totals)
+        rank = np.empty(n_teams, dtype=np.int64)
+        rank[order] = np.arange(n_teams)
+        hits[s, 5, order[0]] = 1
+        qualified = qualify_playoffs(order, div_idx)
+
+        champs = np.full(2, -1, dtype=np.int64)
+        for conf in range(2):
+            # Conference playoff teams in league rank order
+            field = np.empty(n_teams, dtype=np.int64)
+            m = 0
+            for t in order:
+                if qualified[t] and div_idx[t] // 2 == conf:
+                    field[m] = t
+                    m += 1
+                    hits[s, 0, t] = 1
+            rounds = np.full((3, m), -1, dtype=np.int64)
+            champs[conf] = _conference_bracket(field[:m], rounds, strength_off, strength_def, variance,
+                                               home_ice, league_xg, ot_p)
+            for rnd in range(3):
+                for t in rounds[rnd]:
+                    if t >= 0:
+                        hits[s, 1 + rnd, t] = 1
+
+        if champs[0] >= 0 and champs[1] >= 0:
+            cup = _series(champs[0], champs[1], rank[champs[0]] < rank[champs[1]], strength_off, strength_def,
+                          variance, home_ice, league_xg, ot_p)
+            hits[s, 4, cup] = 1
+
+    counts = np.zeros((6, n_teams), dtype=np.int32)
+    for s in range(n_sims):
+        counts += hits[s]
+    return counts
+
+
+# No fastmath: contracting f*w + r*w into an FMA would shift results by an ulp from NumPy
+@njit(cache=True, parallel=True)
+def blend_stats(full_vals, recent_vals, full_weight, recent_weight):
+    """
+    Weighted full-season / recent blend of a (players, stats) block, one player per prange step.
+
+    Args:
+        full_vals (np.ndarray): (n_players, n_stats) float64 full-season stats
+        recent_vals (np.ndarray): Same shape, NaN where no recent value exists
+        full_weight, recent_weight (float): Blend weights
+
+    Returns:
+        np.ndarray: Blended stats; full-season value wherever recent is NaN
+    """
+    out = np.empty_like(full_vals)
+    for i in prange(full_vals.shape[0]):
+        for j in range(full_vals.shape[1]):
+            r = recent_vals[i, j]
+            f = full_vals[i, j]
+            out[i, j] = f if np.isnan(r) else f * full_weight + r * recent_weight
+    return out
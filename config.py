@@ -1,12 +1,14 @@
 # config.py
 # Central configuration for NHL Monte Carlo Model
 
+import os
 from datetime import datetime
 
 # =============================================================================
 # AUTO-GENERATED VALUES
 # =============================================================================
-TODAY = datetime.now()
+# Set NHL_TODAY=YYYY-MM-DD to pin the run date (deterministic replays)
+TODAY = datetime.strptime(os.environ["NHL_TODAY"], "%Y-%m-%d") if os.environ.get("NHL_TODAY") else datetime.now()
 CURRENT_SEASON_START_YEAR = 2025 if TODAY.month >= 7 else 2024
 CURRENT_SEASON_END_YEAR = CURRENT_SEASON_START_YEAR + 1
 CURRENT_SEASON_FULL = f"{CURRENT_SEASON_START_YEAR}-{CURRENT_SEASON_END_YEAR}"
@@ -20,6 +22,10 @@ TODAY_PRETTY = TODAY.strftime("%B %d, %Y")
 DB_FILE = f"data/db/nhl_{CURRENT_SEASON_START_YEAR}_{CURRENT_SEASON_END_YEAR}_players.db"
 SCHEDULE_CSV = f"data/schedule/schedule_{CURRENT_SEASON_START_YEAR}_{CURRENT_SEASON_END_YEAR}.csv"
 PREDICTIONS_CSV = f"data/results/nhl_predictions_{TODAY.strftime('%Y%m%d')}.csv"
+SCHEDULE_CACHE_HOURS = 6               # Reuse the scraped schedule CSV if younger than this
+SCHEDULE_RESULT_DAYS = 3               # Re-scrape early if a game from the last N days has no result yet
+NST_CACHE_HOURS = 6                    # Reuse downloaded player stats if younger than this
+SCHEMA_VERSION = 5                     # Bump when the players/team_agg table layout changes (invalidates the cache)
 
 # =============================================================================
 # SIMULATION SETTINGS
@@ -30,11 +36,21 @@ HOME_ICE_ADVANTAGE = 1.10
 LEAGUE_AVG_XG_PER_60 = 2.95
 OT_HOME_WIN_PROB = 0.55                # Historical: ~55% of OT/SO won by home team
 TEAM_STRENGTH_VARIANCE = 0.15          # ±9% game-to-game variance (injuries, form, etc.)
+POISSON_NORMAL_CUTOFF = 10.0           # Season sims draw goals from a normal approx once xG >= this
+N_WORKERS = None                       # Processes for season sims (None = all CPU cores, 1 = serial)
+
+# =============================================================================
+# SCRAPING
+# =============================================================================
+HOCKEY_REFERENCE_DELAY = 2.1           # Seconds between Hockey-Reference requests (site rate limit)
+HTTP_CACHE_FILE = "data/http_cache.sqlite"  # On-disk response cache (used when requests-cache is installed)
+HTTP_CACHE_SECONDS = 600               # Serve cached pages this long (unless Cache-Control says otherwise), then revalidate
 
 # =============================================================================
 # DATA FILTERS
 # =============================================================================
 MIN_TOI_MINUTES = 20                   # Players must have >60 min 5v5 TOI
+MIN_RECENT_TOI = 5                     # Last-10 rows under this 5v5 TOI are ignored (full season used)
 FALLBACK_OFFENSIVE_RATING = 2.80       # xGF/60 if no data
 FALLBACK_DEFENSIVE_RATING = 2.80       # xGA/60 if no data
 
@@ -61,4 +77,10 @@ TEAM_ABBREV_FIXES = {
     "S.J": "San Jose Sharks",
 }
 
-print(f"Config loaded → Season {CURRENT_SEASON_FULL} | Today: {TODAY_PRETTY}")
\ No newline at end of file
+
+def announce():
+    """
+    Print the loaded season/date once (called by entry points, not at import,
+    so worker processes and library imports stay quiet).
+    """
+    print(f"Config loaded → Season {CURRENT_SEASON_FULL} | Today: {TODAY_PRETTY}")
@@ -2,90 +2,226 @@
 # Single game simulation logic
 
 import numpy as np
-from tqdm import tqdm
-from config import HOME_ICE_ADVANTAGE, LEAGUE_AVG_XG_PER_60, OT_HOME_WIN_PROB, N_SIMS_TODAY, TEAM_STRENGTH_VARIANCE
-from team_strength import get_team_strength
+from config import (HOME_ICE_ADVANTAGE, LEAGUE_AVG_XG_PER_60, OT_HOME_WIN_PROB, N_SIMS_TODAY,
+                    TEAM_STRENGTH_VARIANCE, POISSON_NORMAL_CUTOFF)
+from team_strength import FALLBACK_STRENGTH
+from _sim_kernel import NUMBA_AVAILABLE, simulate_matchup_batch, simulate_season_games
 
+# Shared PCG64 generator for every simulation in this process
+_RNG = np.random.default_rng()
 
-def simulate_game(home, away, db_path):
+
+def spawn_rngs(n):
+    """
+    Spawn independent child generators from the shared generator.
+
+    Args:
+        n (int): Number of child generators
+
+    Returns:
+        list: n statistically independent np.random.Generator streams
+    """
+    return _RNG.spawn(n)
+
+
+def kernel_seed(rng=None):
+    """
+    Draw a seed for numba's generator from rng (defaults to the shared generator).
+    """
+    return int((_RNG if rng is None else rng).integers(2**32))
+
+
+def simulate_game(home, away, strengths, rng=None):
     """
     Simulate a single NHL game using Poisson distribution.
 
+    Same scoring as the season engines: a regulation win is 2-0, and an OT/SO
+    game gives the winner 2 points and the loser 1.
+
     Args:
         home (str): Home team name
         away (str): Away team name
-        db_path (str): Path to player database
+        strengths (dict): Team strengths from precompute_team_strengths
+        rng (np.random.Generator, optional): Generator to draw from, defaults to the shared one
 
     Returns:
         tuple: (winner, home_pts, away_pts, home_goals, away_goals, regulation_win)
     """
-    ho, hd = get_team_strength(home, db_path)
-    ao, ad = get_team_strength(away, db_path)
+    if rng is None:
+        rng = _RNG
+
+    ho, hd = strengths.get(home, FALLBACK_STRENGTH)
+    ao, ad = strengths.get(away, FALLBACK_STRENGTH)
 
     # Apply game-to-game variance (injuries, lineup changes, form, etc.)
     if TEAM_STRENGTH_VARIANCE > 0:
-        ho *= np.random.uniform(1 - TEAM_STRENGTH_VARIANCE, 1 + TEAM_STRENGTH_VARIANCE)
-        hd *= np.random.uniform(1 - TEAM_STRENGTH_VARIANCE, 1 + TEAM_STRENGTH_VARIANCE)
-        ao *= np.random.uniform(1 - TEAM_STRENGTH_VARIANCE, 1 + TEAM_STRENGTH_VARIANCE)
-        ad *= np.random.uniform(1 - TEAM_STRENGTH_VARIANCE, 1 + TEAM_STRENGTH_VARIANCE)
+        ho *= rng.uniform(1 - TEAM_STRENGTH_VARIANCE, 1 + TEAM_STRENGTH_VARIANCE)
+        hd *= rng.uniform(1 - TEAM_STRENGTH_VARIANCE, 1 + TEAM_STRENGTH_VARIANCE)
+        ao *= rng.uniform(1 - TEAM_STRENGTH_VARIANCE, 1 + TEAM_STRENGTH_VARIANCE)
+        ad *= rng.uniform(1 - TEAM_STRENGTH_VARIANCE, 1 + TEAM_STRENGTH_VARIANCE)
 
     home_xg = ho * HOME_ICE_ADVANTAGE * (LEAGUE_AVG_XG_PER_60 / ad)
     away_xg = ao * (LEAGUE_AVG_XG_PER_60 / hd)
 
-    hg = np.random.poisson(home_xg)
-    ag = np.random.poisson(away_xg)
+    hg = rng.poisson(home_xg)
+    ag = rng.poisson(away_xg)
 
     if hg > ag:
         return home, 2, 0, hg, ag, True
     elif ag > hg:
         return away, 0, 2, hg, ag, True
-    else:
-        # Overtime/Shootout
-        winner = home if np.random.rand() < OT_HOME_WIN_PROB else away
-        return winner, 2, 1, hg + (winner == home), ag + (winner == away), False
+    # Overtime/Shootout: the winner scores the deciding goal and takes 2 points, the loser 1
+    if rng.random() < OT_HOME_WIN_PROB:
+        return home, 2, 1, hg + 1, ag, False
+    return away, 1, 2, hg, ag + 1, False
+
 
+def expected_goals(ho, hd, ao, ad, rng, size=None):
+    """
+    Turn team ratings into expected goals, applying game-to-game variance.
+
+    Ratings may be scalars or per-game arrays; size sets how many variance
+    draws to make (one per game or per simulation).
+
+    Args:
+        ho, hd (float | np.ndarray): Home offensive / defensive rating
+        ao, ad (float | np.ndarray): Away offensive / defensive rating
+        rng (np.random.Generator): Random generator to draw from
+        size (int, optional): Number of games to draw variance for
+
+    Returns:
+        tuple: (home_xg, away_xg)
+    """
+    # Apply game-to-game variance (injuries, lineup changes, form, etc.)
+    # Drawn in float32 so float32 ratings stay float32 through the xG math
+    if TEAM_STRENGTH_VARIANCE > 0:
+        low, span = 1 - TEAM_STRENGTH_VARIANCE, 2 * TEAM_STRENGTH_VARIANCE
+        ho = ho * (low + span * rng.random(size, dtype=np.float32))
+        hd = hd * (low + span * rng.random(size, dtype=np.float32))
+        ao = ao * (low + span * rng.random(size, dtype=np.float32))
+        ad = ad * (low + span * rng.random(size, dtype=np.float32))
+
+    home_xg = ho * HOME_ICE_ADVANTAGE * (LEAGUE_AVG_XG_PER_60 / ad)
+    away_xg = ao * (LEAGUE_AVG_XG_PER_60 / hd)
+    return home_xg, away_xg
 
-def predict_todays_games(today_games, db_path):
+
+def _poisson(lam, rng, normal_cutoff):
+    """
+    Vectorized Poisson draws, using a rounded normal approximation where lam >= normal_cutoff.
+    """
+    counts = rng.poisson(lam)
+    big = lam >= normal_cutoff
+    if big.any():
+        approx = np.rint(lam[big] + np.sqrt(lam[big]) * rng.standard_normal(int(big.sum())))
+        counts[big] = np.maximum(approx, 0)
+    return counts
+
+
+def sample_games(home_xg, away_xg, rng, approximate=False):
+    """
+    Draw final scores for a batch of games from their expected goals.
+
+    Uses the numba kernel for 1-D slates when available, otherwise vectorized
+    NumPy (which also takes (n_sims, n_games) arrays).
+
+    Args:
+        home_xg (np.ndarray): Home expected goals per game
+        away_xg (np.ndarray): Away expected goals per game (same shape as home_xg)
+        rng (np.random.Generator): Random generator to draw from (seeds the numba kernel)
+        approximate (bool): Allow the normal approximation for xG >= POISSON_NORMAL_CUTOFF;
+            meant for ensemble season runs, single-matchup odds stay exact
+
+    Returns:
+        tuple: (home_goals, away_goals, regulation) arrays; goals include the OT/SO winner's goal
+    """
+    normal_cutoff = POISSON_NORMAL_CUTOFF if approximate else np.inf
+
+    if NUMBA_AVAILABLE and np.ndim(home_xg) == 1:
+        return simulate_season_games(home_xg, away_xg, OT_HOME_WIN_PROB, kernel_seed(rng), normal_cutoff)
+
+    hg = _poisson(home_xg, rng, normal_cutoff)
+    ag = _poisson(away_xg, rng, normal_cutoff)
+
+    # Overtime/Shootout: ties go to a coin flip weighted toward the home team
+    tie = hg == ag
+    ot_home = rng.random(np.shape(hg)) < OT_HOME_WIN_PROB
+    return hg + (tie & ot_home), ag + (tie & ~ot_home), ~tie
+
+
+def simulate_matchup(home, away, strengths, n_sims, rng):
+    """
+    Simulate the same matchup n_sims times in one vectorized pass.
+
+    Mirrors simulate_game (variance, home ice, Poisson goals, OT/SO coin flip)
+    but draws every simulation at once instead of looping in Python.
+
+    Args:
+        home (str): Home team name
+        away (str): Away team name
+        strengths (dict): Team strengths from precompute_team_strengths
+        n_sims (int): Number of simulations
+        rng (np.random.Generator): Random generator to draw from
+
+    Returns:
+        tuple: (home_won, home_goals, away_goals) arrays of length n_sims
+    """
+    ho, hd = strengths.get(home, FALLBACK_STRENGTH)
+    ao, ad = strengths.get(away, FALLBACK_STRENGTH)
+
+    home_xg, away_xg = expected_goals(ho, hd, ao, ad, rng, n_sims)
+    hg, ag, _ = sample_games(np.broadcast_to(home_xg, n_sims), np.broadcast_to(away_xg, n_sims), rng)
+
+    return hg > ag, hg, ag
+
+
+def predict_todays_games(today_games, strengths, seed=None):
     """
     Run predictions for today's games.
 
     Args:
         today_games (pd.DataFrame): DataFrame of today's games
-        db_path (str): Path to player database
+        strengths (dict): Team strengths from precompute_team_strengths
+        seed (int, optional): Reseed the shared generator for reproducible odds
 
     Returns:
         list: List of prediction dictionaries with game details
     """
-    predictions = []
-
-    for _, game in today_games.iterrows():
-        home, away = game["home"], game["visitor"]
+    global _RNG
+    if seed is not None:
+        _RNG = np.random.default_rng(seed)
 
-        home_wins = home_goals = away_goals = 0
-
-        # Progress bar for each game's simulations
-        for _ in tqdm(range(N_SIMS_TODAY), desc=f"{away} @ {home}", leave=False, unit="sim"):
-            winner, hpts, apts, hgf, agf, reg = simulate_game(home, away, db_path)
-            home_goals += hgf
-            away_goals += agf
-            if winner == home:
-                home_wins += 1
+    predictions = []
 
-        home_pct = home_wins / N_SIMS_TODAY
+    for home, away in zip(today_games["home"].to_numpy(), today_games["visitor"].to_numpy()):
+        if NUMBA_AVAILABLE:
+            ho, hd = strengths.get(home, FALLBACK_STRENGTH)
+            ao, ad = strengths.get(away, FALLBACK_STRENGTH)
+            home_wins, home_goals, away_goals = simulate_matchup_batch(
+                ho, hd, ao, ad, N_SIMS_TODAY, TEAM_STRENGTH_VARIANCE, HOME_ICE_ADVANTAGE,
+                LEAGUE_AVG_XG_PER_60, OT_HOME_WIN_PROB, kernel_seed()
+            )
+        else:
+            home_won, hg, ag = simulate_matchup(home, away, strengths, N_SIMS_TODAY, _RNG)
+            home_wins, home_goals, away_goals = home_won.sum(), hg.sum(), ag.sum()
+
+        # Reduce to plain Python scalars once per game; rounding is left to display
+        home_pct = int(home_wins) / N_SIMS_TODAY
         away_pct = 1 - home_pct
+        home_avg = int(home_goals) / N_SIMS_TODAY
+        away_avg = int(away_goals) / N_SIMS_TODAY
 
         fav = "HOME" if home_pct > 0.62 else "AWAY" if away_pct > 0.62 else "TOSS-UP"
-        total = round((home_goals + away_goals) / N_SIMS_TODAY, 2)
-
-        predictions.append({
-            "home": home,
-            "away": away,
-            "home_pct": home_pct,
-            "away_pct": away_pct,
-            "home_avg_goals": home_goals / N_SIMS_TODAY,
-            "away_avg_goals": away_goals / N_SIMS_TODAY,
-            "favorite": fav,
-            "expected_total": total
-        })
+
+        predictions.append(dict(
+            home=home,
+            away=away,
+            home_pct=home_pct,
+            away_pct=away_pct,
+            home_avg_goals=home_avg,
+            away_avg_goals=away_avg,
+            favorite=fav,
+            expected_total=home_avg + away_avg
+        ))
 
     return predictions
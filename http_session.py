@@ -0,0 +1,77 @@
+# http_session.py
+# Shared pooled HTTP session for Hockey-Reference and Natural Stat Trick
+
+import threading
+import time
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import HTTP_CACHE_FILE, HTTP_CACHE_SECONDS
+
+try:
+    import requests_cache
+except ImportError:
+    requests_cache = None
+
+HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+# One keep-alive pool for every scrape; retries back off on rate limits and server errors.
+# With requests-cache installed, responses are kept on disk for HTTP_CACHE_SECONDS and
+# then revalidated with If-None-Match / If-Modified-Since instead of re-downloaded.
+if requests_cache is not None:
+    SESSION = requests_cache.CachedSession(HTTP_CACHE_FILE, backend="sqlite",
+                                           expire_after=HTTP_CACHE_SECONDS, cache_control=True)
+else:
+    SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4,
+                                      max_retries=Retry(total=3, backoff_factor=2,
+                                                        status_forcelist=[429, 500, 502, 503])))
+
+_last_request = {}
+_lock = threading.Lock()
+
+
+def _is_cached(url):
+    """
+    Whether requests-cache holds an unexpired response for a plain GET of url.
+
+    Args:
+        url (str): URL to check
+
+    Returns:
+        bool: True if the next GET will be answered from disk without a request
+    """
+    if requests_cache is None:
+        return False
+    try:
+        cached = SESSION.cache.get_response(SESSION.cache.create_key(requests.Request("GET", url).prepare()))
+    except AttributeError:  # requests-cache < 1.0 has no create_key/get_response
+        return False
+    return cached is not None and not cached.is_expired
+
+
+def get(url, min_interval=0.0, **kwargs):
+    """
+    GET through the shared session, spacing requests to the same host.
+
+    Responses requests-cache can serve from disk skip the spacing: they never
+    reach the host.
+
+    Args:
+        url (str): URL to fetch
+        min_interval (float): Minimum seconds since the previous request to this host
+        **kwargs: Passed through to requests.Session.get
+
+    Returns:
+        requests.Response: The response
+    """
+    if min_interval and not _is_cached(url):
+        host = urlparse(url).netloc
+        with _lock:
+            wait = _last_request.get(host, 0.0) + min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            _last_request[host] = time.monotonic()
+    return SESSION.get(url, **kwargs)
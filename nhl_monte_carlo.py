@@ -7,10 +7,16 @@ import pandas as pd
 import numpy as np
 import sqlite3
 import requests
-from bs4 import BeautifulSoup
-from collections import defaultdict, Counter
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import contextlib
+import functools
+import lxml.html
+import os
 import time
-from io import StringIO
+from io import BytesIO, StringIO
 
 # =============================================================================
 # TEAM MAPPINGS & DIVISIONS (only edit if NHL adds/removes teams)
@@ -35,6 +41,18 @@ TEAM_MAP = {
 
 # Apply any extra fixes from config
 TEAM_MAP.update(TEAM_ABBREV_FIXES)
+# clean_team strips dots before looking codes up, so "L.A" must also resolve as "LA"
+TEAM_MAP.update({code.replace(".", ""): team for code, team in list(TEAM_MAP.items()) if "." in code})
+
+# One keep-alive session for every request (schedule + NST pages and CSVs), with retries
+HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=4,
+                                       max_retries=Retry(total=3, backoff_factor=0.5,
+                                                         status_forcelist=[500, 502, 503, 504])))
+
+# Shared PCG64 generator for every simulation in this script
+_RNG = np.random.default_rng()
 
 DIVISIONS = {
     "Atlantic": ["Boston Bruins", "Buffalo Sabres", "Detroit Red Wings", "Florida Panthers",
@@ -46,7 +64,12 @@ DIVISIONS = {
     "Pacific": ["Anaheim Ducks", "Calgary Flames", "Edmonton Oilers", "Los Angeles Kings",
                 "San Jose Sharks", "Seattle Kraken", "Vancouver Canucks", "Vegas Golden Knights"]
 }
+EAST = frozenset(DIVISIONS["Atlantic"] + DIVISIONS["Metropolitan"])
+WEST = frozenset(DIVISIONS["Central"] + DIVISIONS["Pacific"])
+TEAM_TO_DIV = {team: div for div, teams in DIVISIONS.items() for team in teams}
+TEAM_TO_CONF = {team: "East" if team in EAST else "West" for team in TEAM_TO_DIV}
 
+announce()
 print("="*100)
 print(f"NHL MONTE CARLO PRO — {CURRENT_SEASON_FULL} SEASON".center(100))
 print(f"Live 5v5 xGF/xGA model | {N_SIMS_FULL:,} simulations | Today: {TODAY_PRETTY}".center(100))
@@ -54,43 +77,63 @@ print("="*100)
 
 
 # ================= 1. SCRAPE FULL SCHEDULE FROM HOCKEY-REFERENCE =================
+def fresh_today(path):
+    # Written since local midnight → reruns the same day skip the network
+    midnight = datetime.combine(TODAY.date(), datetime.min.time()).timestamp()
+    return os.path.exists(path) and os.path.getmtime(path) >= midnight
+
+
+@functools.lru_cache(maxsize=1)
 def scrape_schedule():
+    if fresh_today(SCHEDULE_CSV):
+        print(f"Using today's cached schedule: {SCHEDULE_CSV}")
+        df = pd.read_csv(SCHEDULE_CSV, dtype={"ot": str})
+        df["ot"] = df["ot"].fillna("")
+        return df
+
     url = f"https://www.hockey-reference.com/leagues/NHL_{SEASON_CODE}_games.html"
     print(f"Scraping {CURRENT_SEASON_FULL} schedule from Hockey-Reference...")
-    headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
-    r = requests.get(url, headers=headers, timeout=30)
+    r = _SESSION.get(url, headers=HEADERS, timeout=30)
     if r.status_code != 200:
         raise Exception(f"Failed to load schedule: HTTP {r.status_code}")
     
-    soup = BeautifulSoup(r.text, "html.parser")
-    table = soup.find("table", {"id": "schedule"}) or soup.find("table", class_="stats_table")
-    if not table:
+    # lxml parses in C; XPath pulls the table and its rows without a Python tree walk.
+    # When the schedule table can be cut out of the page, only that slice is parsed.
+    page = r.content
+    marker = page.find(b'id="schedule"')
+    start, end = page.rfind(b"<table", 0, max(marker, 0)), page.find(b"</table>", max(marker, 0))
+    doc = lxml.html.fromstring(page[start:end + 8] if marker >= 0 and start >= 0 and end >= 0 else page)
+    tables = (doc.xpath('//table[@id="schedule"]')
+              or doc.xpath('//table[contains(concat(" ", normalize-space(@class), " "), " stats_table ")]'))
+    if not tables:
         raise Exception("Schedule table not found — Hockey-Reference layout changed")
 
-    games = []
-    for row in table.find_all("tr")[1:]:
-        cells = row.find_all(["th", "td"])
+    # One list per column → the frame is built column-wise, no per-game dicts
+    dates, visitors, homes, vgs, hgs, ots = [], [], [], [], [], []
+    for row in tables[0].xpath(".//tr")[1:]:
+        cells = [cell.text_content().strip() for cell in row.xpath("./th | ./td")]
         if len(cells) < 8: continue
         
-        date_cell = cells[0].get_text(strip=True)
+        date_cell = cells[0]
         if not date_cell or "-" not in date_cell: continue
         date_str = date_cell[:10]
 
-        visitor = cells[2].get_text(strip=True)
-        home = cells[4].get_text(strip=True)
-        vg = int(cells[3].get_text(strip=True) or 0)
-        hg = int(cells[5].get_text(strip=True) or 0)
-        ot = cells[6].get_text(strip=True)
+        visitor = cells[2]
+        home = cells[4]
+        vg = int(cells[3] or 0)
+        hg = int(cells[5] or 0)
+        ot = cells[6]
         ot = ot if ot in ["OT", "SO"] else ""
-        played = vg > 0 and hg > 0
 
-        visitor = TEAM_MAP.get(visitor[:3].upper(), visitor)
-        home = TEAM_MAP.get(home[:3].upper(), home)
+        dates.append(date_str)
+        visitors.append(TEAM_MAP.get(visitor[:3].upper(), visitor))
+        homes.append(TEAM_MAP.get(home[:3].upper(), home))
+        vgs.append(vg); hgs.append(hg); ots.append(ot)
 
-        games.append({"date": date_str, "visitor": visitor, "home": home,
-                      "vg": vg, "hg": hg, "ot": ot, "played": played})
-
-    df = pd.DataFrame(games).sort_values("date").reset_index(drop=True)
+    vgs, hgs = np.array(vgs, dtype=np.int64), np.array(hgs, dtype=np.int64)
+    df = pd.DataFrame({"date": dates, "visitor": visitors, "home": homes, "vg": vgs, "hg": hgs,
+                       "ot": ots, "played": (vgs > 0) & (hgs > 0)})
+    df = df.sort_values("date").reset_index(drop=True)
     df.to_csv(SCHEDULE_CSV, index=False)
     print(f"   Success: {len(df)} games scraped ({df['played'].sum()} played)")
     return df
@@ -98,41 +141,60 @@ def scrape_schedule():
 
 # ================= 2. CURRENT STANDINGS =================
 def build_current_standings(schedule_df):
-    standings = defaultdict(lambda: {"points": 0, "row": 0, "otw": 0, "gf": 0, "ga": 0, "gp": 0})
-    for _, g in schedule_df[schedule_df.played].iterrows():
-        h, a = g.home, g.visitor
-        standings[h]["gf"] += g.hg; standings[h]["ga"] += g.vg; standings[h]["gp"] += 1
-        standings[a]["gf"] += g.vg; standings[a]["ga"] += g.hg; standings[a]["gp"] += 1
-
-        if g.hg > g.vg and g.ot == "":       standings[h]["points"] += 2; standings[h]["row"] += 1
-        elif g.vg > g.hg and g.ot == "":     standings[a]["points"] += 2; standings[a]["row"] += 1
-        elif g.hg > g.vg:                   standings[h]["points"] += 2; standings[h]["otw"] += 1; standings[a]["points"] += 1
-        else:                               standings[a]["points"] += 2; standings[a]["otw"] += 1; standings[h]["points"] += 1
-
-    df = pd.DataFrame.from_dict(standings, orient="index").reset_index().rename(columns={"index": "team"})
+    played = schedule_df[schedule_df.played]
+    hg, vg = played.hg.to_numpy(), played.vg.to_numpy()
+    reg = (played.ot == "").to_numpy()
+    home_reg_win = (hg > vg) & reg
+    away_reg_win = (vg > hg) & reg
+    home_ot_win = (hg > vg) & ~reg
+    away_ot_win = ~(home_reg_win | away_reg_win | home_ot_win)
+
+    # One row per team per game (home, visitor interleaved → first-seen team order), summed by team
+    per_side = pd.DataFrame({
+        "team": np.column_stack([played.home.to_numpy(), played.visitor.to_numpy()]).ravel(),
+        "points": np.column_stack([2 * (home_reg_win | home_ot_win) + away_ot_win,
+                                   2 * (away_reg_win | away_ot_win) + home_ot_win]).ravel(),
+        "row": np.column_stack([home_reg_win, away_reg_win]).ravel(),
+        "otw": np.column_stack([home_ot_win, away_ot_win]).ravel(),
+        "gf": np.column_stack([hg, vg]).ravel(),
+        "ga": np.column_stack([vg, hg]).ravel(),
+        "gp": np.ones(2 * len(played), dtype=np.int64),
+    })
+    df = per_side.groupby("team", sort=False).sum().astype(np.int64).reset_index()
     df["gf-ga"] = df["gf"] - df["ga"]
     return df
 
 
 # ================= 3. DOWNLOAD LIVE NST DATA =================
 def download_nst_data():
+    if fresh_today(DB_FILE):
+        try:
+            conn = sqlite3.connect(DB_FILE)
+            cached = pd.read_sql("SELECT * FROM players", conn)
+            conn.close()
+            print(f"Using today's cached player stats: {DB_FILE} ({len(cached)} players)")
+            return cached
+        except Exception:
+            pass  # no players table yet → download
+
     print("Downloading live 2025-26 player stats from Natural Stat Trick...")
     skaters_url = "https://www.naturalstattrick.com/playerteams.php?fromseason=20252026&thruseason=20252026&stype=2&sit=5v5&score=all&stdoi=oi&rate=n&team=ALL&pos=S&loc=B&toi=0&gpfilt=none&fd=&td=&tgp=410&lines=single&draftteam=ALL"
     goalies_url = skaters_url.replace("&pos=S", "&pos=G")
     headers = {"User-Agent": "Mozilla/5.0"}
 
+    def fetch(url):
+        r = _SESSION.get(url, headers=headers, timeout=20)
+        csv_links = lxml.html.fromstring(r.content).xpath('//a[contains(text(), "CSV")]/@href')
+        if not csv_links:
+            return pd.read_html(StringIO(r.text))[0]
+        csv = _SESSION.get("https://www.naturalstattrick.com" + csv_links[0], headers=headers, timeout=20)
+        return pd.read_csv(BytesIO(csv.content))
+
     try:
-        # Skaters
-        r = requests.get(skaters_url, headers=headers, timeout=20)
-        soup = BeautifulSoup(r.text, "html.parser")
-        csv_link = soup.find("a", string=lambda t: t and "CSV" in t)
-        skaters = pd.read_csv("https://www.naturalstattrick.com" + csv_link["href"]) if csv_link else pd.read_html(StringIO(r.text))[0]
-
-        # Goalies
-        r = requests.get(goalies_url, headers=headers, timeout=20)
-        soup = BeautifulSoup(r.text, "html.parser")
-        csv_link = soup.find("a", string=lambda t: t and "CSV" in t)
-        goalies = pd.read_csv("https://www.naturalstattrick.com" + csv_link["href"]) if csv_link else pd.read_html(StringIO(r.text))[0]
+        # Skaters and goalies are independent round-trips → fetch both at once
+        with ThreadPoolExecutor(max_workers=2) as ex:
+            sk_fut, go_fut = ex.submit(fetch, skaters_url), ex.submit(fetch, goalies_url)
+            skaters, goalies = sk_fut.result(), go_fut.result()
 
         print(f"   Success: {len(skaters)} skaters + {len(goalies)} goalies loaded")
     except Exception as e:
@@ -146,109 +208,148 @@ def download_nst_data():
         parts = [p for p in parts if p]
         return TEAM_MAP.get(parts[-1].upper(), team_str) if parts else team_str
 
-    if not skaters.empty: skaters["Team"] = skaters["Team"].apply(clean_team)
-    if not goalies.empty: goalies["Team"] = goalies["Team"].apply(clean_team)
+    # Clean each distinct team string once, then remap the column
+    def clean_teams(teams):
+        return teams.map({t: clean_team(t) for t in teams.dropna().unique()})
+
+    if not skaters.empty: skaters["Team"] = clean_teams(skaters["Team"])
+    if not goalies.empty: goalies["Team"] = clean_teams(goalies["Team"])
 
     all_players = pd.concat([skaters, goalies], ignore_index=True, sort=False)
     if not all_players.empty:
-        all_players.to_sql("players", sqlite3.connect(DB_FILE), if_exists="replace", index=False)
+        conn = sqlite3.connect(DB_FILE)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        all_players.to_sql("players", conn, if_exists="replace", index=False)
+        conn.close()
         print(f"   Success: {len(all_players)} players saved to {DB_FILE}")
     return all_players
 
 
 # ================= 4. TEAM STRENGTH (xGF/60 & xGA/60) =================
-def get_team_strength(team):
-    # Early exit if DB doesn't exist
-    try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='players'")
-        if not cursor.fetchone():
-            conn.close()
-            return FALLBACK_OFFENSIVE_RATING, FALLBACK_DEFENSIVE_RATING
-    except:
-        return FALLBACK_OFFENSIVE_RATING, FALLBACK_DEFENSIVE_RATING
+# Every team's (off, def) rating, filled by one grouped query instead of a DB round-trip per game
+_STRENGTH_CACHE = None
+_XG_CACHE = {}      # (home, away) → (home_xg, away_xg); reset with the ratings
+_SERIES_CACHE = {}  # (team1, team2, home_first) → P(team1 wins); reset with the ratings
+
 
+def load_team_strengths():
+    global _STRENGTH_CACHE
+    _STRENGTH_CACHE = {}
+    _XG_CACHE.clear()
+    _SERIES_CACHE.clear()
     query = '''
-        SELECT 
-            COALESCE(SUM("xGF"), 0) as total_xgf,
-            COALESCE(SUM("TOI"), 0) as total_toi,
-            COALESCE(SUM("xGA"), 0) as total_xga
-        FROM players 
-        WHERE Team = ? AND "TOI" > ?
+        SELECT Team, SUM("xGF") as total_xgf, SUM("TOI") as total_toi, SUM("xGA") as total_xga
+        FROM players
+        WHERE "TOI" > ?
+        GROUP BY Team
     '''
     try:
-        df = pd.read_sql(query, conn, params=(team, MIN_TOI_MINUTES))
-        conn.close()
-    except:
-        conn.close()
-        return FALLBACK_OFFENSIVE_RATING, FALLBACK_DEFENSIVE_RATING
+        with contextlib.closing(sqlite3.connect(DB_FILE)) as conn:
+            rows = conn.execute(query, (MIN_TOI_MINUTES,)).fetchall()
+    except sqlite3.Error:
+        return _STRENGTH_CACHE  # no DB / no players table → every team falls back
 
-    if df.empty:
-        return FALLBACK_OFFENSIVE_RATING, FALLBACK_DEFENSIVE_RATING
+    for team, xgf, toi, xga in rows:
+        # FINAL SAFETY NET — if TOI is 0 or None, leave the team on the fallback
+        if not toi or toi <= 0:
+            continue
+        off = max(1.8, min((xgf or 0) / (toi / 60.0), 4.8))   # Sanity clamp
+        def_ = max(1.8, min((xga or 0) / (toi / 60.0), 4.8))
+        _STRENGTH_CACHE[team] = (round(off, 3), round(def_, 3))
+    return _STRENGTH_CACHE
 
-    row = df.iloc[0]
-    toi = row.total_toi
 
-    # FINAL SAFETY NET — if TOI is 0 or None, fallback
-    if not toi or toi <= 0:
-        return FALLBACK_OFFENSIVE_RATING, FALLBACK_DEFENSIVE_RATING
-
-    # Safe calculations
-    off = row.total_xgf / (toi / 60.0)
-    def_ = row.total_xga / (toi / 60.0)
+def get_team_strength(team):
+    if _STRENGTH_CACHE is None:
+        load_team_strengths()
+    return _STRENGTH_CACHE.get(team, (FALLBACK_OFFENSIVE_RATING, FALLBACK_DEFENSIVE_RATING))
 
-    # Sanity clamp
-    off = max(1.8, min(off, 4.8))
-    def_ = max(1.8, min(def_, 4.8))
 
-    return round(off, 3), round(def_, 3)
+# ================= 5. SIMULATION ENGINE =================
+def game_xg(home, away):
+    # Expected goals depend only on the pair → computed once per matchup, then reused
+    key = (home, away)
+    if key not in _XG_CACHE:
+        ho, hd = get_team_strength(home)
+        ao, ad = get_team_strength(away)
+        _XG_CACHE[key] = (ho * HOME_ICE_ADVANTAGE * (LEAGUE_AVG_XG_PER_60 / ad),
+                          ao * (LEAGUE_AVG_XG_PER_60 / hd))
+    return _XG_CACHE[key]
 
 
-# ================= 5. SIMULATION ENGINE =================
 def simulate_game(home, away):
-    ho, hd = get_team_strength(home)
-    ao, ad = get_team_strength(away)
-    home_xg = ho * HOME_ICE_ADVANTAGE * (LEAGUE_AVG_XG_PER_60 / ad)
-    away_xg = ao * (LEAGUE_AVG_XG_PER_60 / hd)
-
-    hg = np.random.poisson(home_xg)
-    ag = np.random.poisson(away_xg)
+    home_xg, away_xg = game_xg(home, away)
+    hg = _RNG.poisson(home_xg)
+    ag = _RNG.poisson(away_xg)
 
     if hg > ag:
         return home, 2, 0, hg, ag, True
     elif ag > hg:
         return away, 0, 2, hg, ag, True
     else:
-        winner = home if np.random.rand() < OT_HOME_WIN_PROB else away
+        winner = home if _RNG.random() < OT_HOME_WIN_PROB else away
         return winner, 2, 1, hg + (winner == home), ag + (winner == away), False
 
 
+def home_win_prob(home, away):
+    # Exact P(home wins) under simulate_game: P(hg > ag) + P(hg == ag) * OT_HOME_WIN_PROB
+    home_xg, away_xg = game_xg(home, away)
+    n = 40  # goals beyond this carry < 1e-15 of the mass for any clamped rating
+    ph = np.exp(-home_xg) * np.cumprod(np.r_[1.0, home_xg / np.arange(1, n)])
+    pa = np.exp(-away_xg) * np.cumprod(np.r_[1.0, away_xg / np.arange(1, n)])
+    below = np.r_[0.0, np.cumsum(pa)[:-1]]  # P(ag < k)
+    return ph @ below + (ph @ pa) * OT_HOME_WIN_PROB
+
+
+def series_win_prob(team1, team2, home_first):
+    # P(team1 wins a best-of-7 with home ice alternating each game), by DP over (wins1, wins2)
+    key = (team1, team2, home_first)
+    if key not in _SERIES_CACHE:
+        p_home = home_win_prob(team1, team2)       # team1 at home
+        p_away = 1.0 - home_win_prob(team2, team1)  # team1 on the road
+        reach = {(0, 0): 1.0}
+        p_series = 0.0
+        for game in range(7):
+            p = p_home if (game % 2 == 0) == home_first else p_away
+            nxt = {}
+            for (w1, w2), prob in reach.items():
+                for (a, b), q in (((w1 + 1, w2), p), ((w1, w2 + 1), 1.0 - p)):
+                    if a == 4:
+                        p_series += prob * q
+                    elif b < 4:
+                        nxt[a, b] = nxt.get((a, b), 0.0) + prob * q
+            reach = nxt
+        _SERIES_CACHE[key] = p_series
+    return _SERIES_CACHE[key]
+
+
 def best_of_7(team1, team2, home_first):
-    wins1 = wins2 = 0
-    home_turn = home_first
-    while wins1 < 4 and wins2 < 4:
-        winner = simulate_game(team1 if home_turn else team2, team2 if home_turn else team1)[0]
-        if winner == team1: wins1 += 1
-        else: wins2 += 1
-        home_turn = not home_turn
-    return team1 if wins1 == 4 else team2
+    # One draw from the exact series distribution instead of playing out 4-7 games
+    return team1 if _RNG.random() < series_win_prob(team1, team2, home_first) else team2
 
 
 # ================= 6. PLAYOFF QUALIFICATION =================
-def get_playoff_teams(final_standings):
-    playoff = []
-    for div, teams in DIVISIONS.items():
-        div_df = final_standings[final_standings.team.isin(teams)].copy()
-        div_df = div_df.sort_values(by=["points", "row", "otw", "gf-ga", "gf"], ascending=False)
-        playoff.extend(div_df.head(3).team.tolist())
-
-    remaining = final_standings[~final_standings.team.isin(playoff)].copy()
-    east = DIVISIONS["Atlantic"] + DIVISIONS["Metropolitan"]
-    west = DIVISIONS["Central"] + DIVISIONS["Pacific"]
-    playoff.extend(remaining[remaining.team.isin(east)].head(2).team.tolist())
-    playoff.extend(remaining[remaining.team.isin(west)].head(2).team.tolist())
-    return list(dict.fromkeys(playoff))[:16]  # dedup & cap at 16
+def get_playoff_teams(ranked_teams):
+    # ranked_teams is best-first: top 3 per division, then the next 2 per conference as wildcards
+    per_div = dict.fromkeys(DIVISIONS, 0)
+    per_conf = {"East": 0, "West": 0}
+    leaders, rest = [], []
+    for team in ranked_teams:
+        div = TEAM_TO_DIV.get(team)
+        if div is None: continue
+        if per_div[div] < 3:
+            per_div[div] += 1
+            leaders.append(team)
+        else:
+            rest.append(team)
+
+    wildcards = []
+    for team in rest:
+        if per_conf[TEAM_TO_CONF[team]] < 2:
+            per_conf[TEAM_TO_CONF[team]] += 1
+            wildcards.append(team)
+    return (leaders + wildcards)[:16]
 
 
 # ================= 7. TODAY'S GAMES — NOW USING THE EXACT SAME SIM ENGINE =================
@@ -257,25 +358,29 @@ if SHOW_TODAYS_GAMES:
     print(f"TODAY'S NHL GAMES — {TODAY_PRETTY} — LIVE MODEL ODDS ({N_SIMS_TODAY:,} sims each)")
     print("="*88)
 
-    # Reuse schedule if already loaded, otherwise scrape
-    if 'schedule' not in locals():
-        schedule = scrape_schedule()
+    schedule = scrape_schedule()  # memoized, section 8 gets the same frame
     today_games = schedule[schedule["date"] == TODAY_STR]
 
     if today_games.empty:
         print("   No games scheduled today.\n")
     else:
-        for _, game in today_games.iterrows():
-            home, away = game["home"], game["visitor"]
-
-            home_wins = home_goals = away_goals = 0
-            for _ in range(N_SIMS_TODAY):
-                winner, hpts, apts, hgf, agf, reg = simulate_game(home, away)
-                home_goals += hgf
-                away_goals += agf
-                if winner == home:
-                    home_wins += 1
-
+        homes, aways = today_games["home"].to_numpy(), today_games["visitor"].to_numpy()
+        ho, hd = np.array([get_team_strength(t) for t in homes]).T
+        ao, ad = np.array([get_team_strength(t) for t in aways]).T
+        home_xg = ho * HOME_ICE_ADVANTAGE * (LEAGUE_AVG_XG_PER_60 / ad)
+        away_xg = ao * (LEAGUE_AVG_XG_PER_60 / hd)
+
+        # Every game × every sim in one (n_games, N_SIMS_TODAY) draw, same rules as simulate_game
+        shape = (len(homes), N_SIMS_TODAY)
+        hg = _RNG.poisson(home_xg[:, None], shape)
+        ag = _RNG.poisson(away_xg[:, None], shape)
+        tie = hg == ag
+        ot_home = _RNG.random(shape) < OT_HOME_WIN_PROB
+        hg += tie & ot_home
+        ag += tie & ~ot_home
+
+        for home, away, home_wins, home_goals, away_goals in zip(
+                homes, aways, (hg > ag).sum(axis=1), hg.sum(axis=1), ag.sum(axis=1)):
             home_pct = home_wins / N_SIMS_TODAY
             away_pct = 1 - home_pct
 
@@ -293,67 +398,132 @@ schedule = scrape_schedule()
 current_standings = build_current_standings(schedule)
 remaining_games = schedule[~schedule.played]
 download_nst_data()
+load_team_strengths()  # re-read ratings from the fresh download
 
 all_teams = sorted(current_standings.team.unique())
-playoff_counter = Counter()
-cup_counter = Counter()
-pres_counter = Counter()
+# Outcome team ids, collected per sim and counted with one bincount each at the end
+playoff_ids = np.full((N_SIMS_FULL, 16), -1, dtype=np.int32)
+cup_ids = np.full(N_SIMS_FULL, -1, dtype=np.int32)
+pres_ids = np.empty(N_SIMS_FULL, dtype=np.int32)
+
+# Team → row id, and the remaining schedule as id arrays, built once
+team_names = current_standings.team.to_numpy()
+team_id = {team: i for i, team in enumerate(team_names)}
+# Conference membership as a bitset over team ids: bit i set ⇔ team i is in the East
+EAST_MASK = sum(1 << i for i, team in enumerate(team_names) if team in EAST)
+WEST_MASK = sum(1 << i for i, team in enumerate(team_names) if team in WEST)
+h_ids = remaining_games["home"].map(team_id).to_numpy()
+a_ids = remaining_games["visitor"].map(team_id).to_numpy()
+n_teams = len(team_id)
+# Team id → position in the current sim's ranking, refilled from the lexsort order
+seed_rank = np.empty(n_teams, dtype=np.int64)
+seed_positions = np.arange(n_teams)
+base = current_standings[["points", "row", "otw", "gf", "ga"]].to_numpy(dtype=np.int64)
+DRAW_BLOCK = 1000  # seasons per batched draw
+
+
+def season_totals(n):
+    """
+    Final standings for n seasons as one (n, 5, n_teams) int32 array (points, row, otw, gf, ga),
+    every game drawn in one tensor.
+
+    Same scoring as simulate_game: ties go to OT, where the home side takes 2 points
+    and the OT winner gets the extra goal.
+    """
+    hgs = _RNG.poisson(home_xg, size=(n, len(h_ids)))
+    ags = _RNG.poisson(away_xg, size=(n, len(h_ids)))
+    ot_home = _RNG.random((n, len(h_ids))) < OT_HOME_WIN_PROB
+
+    reg = hgs != ags
+    hgf = hgs + (~reg & ot_home)
+    agf = ags + (~reg & ~ot_home)
+    hpts = np.where(ags > hgs, 0, 2)
+    apts = np.where(ags > hgs, 2, np.where(hgs > ags, 0, 1))
+
+    # Flat (sim, team) slots so each stat is one bincount per side
+    offsets = np.arange(n)[:, None] * n_teams
+    home_slot, away_slot = (offsets + h_ids).ravel(), (offsets + a_ids).ravel()
+
+    def tally(home_vals, away_vals):
+        totals = (np.bincount(home_slot, home_vals.ravel(), n * n_teams)
+                  + np.bincount(away_slot, away_vals.ravel(), n * n_teams))
+        return totals.reshape(n, n_teams).astype(np.int64)
+
+    totals = np.empty((n, 5, n_teams), dtype=np.int32)
+    totals[:, 0] = base[:, 0] + tally(hpts, apts)
+    totals[:, 1] = base[:, 1] + tally((hpts == 2) & reg, (apts == 2) & reg)
+    totals[:, 2] = base[:, 2] + tally(hpts == 2, apts == 2)
+    totals[:, 3] = base[:, 3] + tally(hgf, agf)
+    totals[:, 4] = base[:, 4] + tally(agf, hgf)
+    return totals
+
+
+# Expected goals per remaining game, fixed for the whole run (ratings don't change between sims)
+ratings = np.array([get_team_strength(t) for t in current_standings.team]).reshape(-1, 2)
+home_xg = ratings[h_ids, 0] * HOME_ICE_ADVANTAGE * (LEAGUE_AVG_XG_PER_60 / ratings[a_ids, 1])
+away_xg = ratings[a_ids, 0] * (LEAGUE_AVG_XG_PER_60 / ratings[h_ids, 1])
 
 print(f"\nRunning {N_SIMS_FULL:,} full-season simulations on {len(remaining_games)} games...")
 start_time = time.time()
 
-for sim in range(N_SIMS_FULL):
-    if SHOW_PROGRESS_EVERY and sim % SHOW_PROGRESS_EVERY == 0 and sim > 0:
-        print(f"   → {sim:,}/{N_SIMS_FULL:,} simulations complete")
-
-    standings = current_standings.copy(deep=True)
-
-    for _, game in remaining_games.iterrows():
-        home, away = game.home, game.visitor
-        winner, hpts, apts, hgf, agf, reg = simulate_game(home, away)
-
-        h_idx = standings[standings.team == home].index[0]
-        a_idx = standings[standings.team == away].index[0]
-
-        standings.loc[h_idx, ["points", "gf", "ga"]] += [hpts, hgf, agf]
-        standings.loc[a_idx, ["points", "gf", "ga"]] += [apts, agf, hgf]
-        if hpts == 2 and reg: standings.loc[h_idx, "row"] += 1
-        if apts == 2 and reg: standings.loc[a_idx, "row"] += 1
-        if hpts == 2: standings.loc[h_idx, "otw"] += 1
-        if apts == 2: standings.loc[a_idx, "otw"] += 1
-
-    standings["gf-ga"] = standings["gf"] - standings["ga"]
-    final = standings.sort_values(by=["points", "row", "otw", "gf-ga", "gf"], ascending=False).reset_index(drop=True)
-    pres_counter[final.iloc[0].team] += 1
-
-    playoff_teams = get_playoff_teams(final)
-    for t in playoff_teams:
-        playoff_counter[t] += 1
-
-    east = [t for t in playoff_teams if t in DIVISIONS["Atlantic"] + DIVISIONS["Metropolitan"]]
-    west = [t for t in playoff_teams if t in DIVISIONS["Central"] + DIVISIONS["Pacific"]]
-    east.sort(key=lambda x: final[final.team == x].index[0])
-    west.sort(key=lambda x: final[final.team == x].index[0])
-
-    east_champ = None
-    west_champ = None
-    if len(east) >= 2:
-        while len(east) > 1:
-            east = [best_of_7(east[i], east[i+1], home_first=True) for i in range(0, len(east), 2)]
-        east_champ = east[0]
-    if len(west) >= 2:
-        while len(west) > 1:
-            west = [best_of_7(west[i], west[i+1], home_first=True) for i in range(0, len(west), 2)]
-        west_champ = west[0]
-
-    if east_champ and west_champ:
-        home_first = final[final.team == east_champ].index[0] < final[final.team == west_champ].index[0]
-        cup_winner = best_of_7(east_champ, west_champ, home_first)
-        cup_counter[cup_winner] += 1
+# Progress is printed between blocks of SHOW_PROGRESS_EVERY sims, never inside the sim loop
+block = SHOW_PROGRESS_EVERY or N_SIMS_FULL
+for block_start in range(0, N_SIMS_FULL, block):
+    if block_start:
+        print(f"   → {block_start:,}/{N_SIMS_FULL:,} simulations complete")
+
+    block_end = min(block_start + block, N_SIMS_FULL)
+    for sim in range(block_start, block_end):
+        # Seasons are drawn and tallied DRAW_BLOCK at a time (bounds the (sims, games) tensors)
+        if (sim - block_start) % DRAW_BLOCK == 0:
+            drawn_from = sim
+            drawn = season_totals(min(DRAW_BLOCK, block_end - sim))
+        points, row, otw, gf, ga = drawn[sim - drawn_from]
+
+        # Rank with one lexsort over the arrays (no DataFrame); negated keys keep tied
+        # teams in standings order, exactly as the stable descending sort_values did
+        order = np.lexsort((-gf, -(gf - ga), -otw, -row, -points))
+        ranked = team_names[order].tolist()
+        pres_ids[sim] = order[0]
+
+        playoff_teams = get_playoff_teams(ranked)
+        qualified_ids = [team_id[t] for t in playoff_teams]
+        playoff_ids[sim, :len(playoff_teams)] = qualified_ids
+
+        # Conference fields by bit test, walked in rank order → already sorted by seed
+        qualified = sum(1 << i for i in qualified_ids)
+        east_field, west_field = qualified & EAST_MASK, qualified & WEST_MASK
+        rank_order = order.tolist()
+        east = [team_names[i] for i in rank_order if east_field >> i & 1]
+        west = [team_names[i] for i in rank_order if west_field >> i & 1]
+
+        east_champ = None
+        west_champ = None
+        if len(east) >= 2:
+            while len(east) > 1:
+                east = [best_of_7(east[i], east[i+1], home_first=True) for i in range(0, len(east), 2)]
+            east_champ = east[0]
+        if len(west) >= 2:
+            while len(west) > 1:
+                west = [best_of_7(west[i], west[i+1], home_first=True) for i in range(0, len(west), 2)]
+            west_champ = west[0]
+
+        if east_champ and west_champ:
+            seed_rank[order] = seed_positions
+            home_first = seed_rank[team_id[east_champ]] < seed_rank[team_id[west_champ]]
+            cup_winner = best_of_7(east_champ, west_champ, home_first)
+            cup_ids[sim] = team_id[cup_winner]
 
 
 # ================= 9. FINAL RESULTS =================
 elapsed = time.time() - start_time
+n_teams = len(team_id)
+playoff_counts = np.bincount(playoff_ids[playoff_ids >= 0], minlength=n_teams)
+cup_counts = np.bincount(cup_ids[cup_ids >= 0], minlength=n_teams)
+pres_counts = np.bincount(pres_ids, minlength=n_teams)
+playoff_counter = dict(zip(current_standings.team, playoff_counts.tolist()))
+cup_counter = dict(zip(current_standings.team, cup_counts.tolist()))
+pres_counter = dict(zip(current_standings.team, pres_counts.tolist()))
 results = []
 for team in all_teams:
     results.append({
@@ -1,13 +1,20 @@
 # nhl_rosters.py
 # Player roster and stats scraping from Natural Stat Trick with recent form weighting
 
+import time
 import pandas as pd
 import numpy as np
 import sqlite3
-import requests
-from bs4 import BeautifulSoup
-from io import StringIO
-from config import TEAM_ABBREV_FIXES, MIN_TOI_MINUTES, RECENT_FORM_WEIGHT
+import lxml.html
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
+from types import MappingProxyType
+import http_session
+from _sim_kernel import NUMBA_AVAILABLE, blend_stats
+from config import (
+    TEAM_ABBREV_FIXES, MIN_TOI_MINUTES, MIN_RECENT_TOI, RECENT_FORM_WEIGHT, SCHEMA_VERSION, NST_CACHE_HOURS
+)
+from team_strength import create_team_agg_table
 
 # Team mappings (consistent with schedule module)
 TEAM_MAP = {
@@ -31,6 +38,14 @@ TEAM_MAP = {
 # Apply config fixes
 TEAM_MAP.update(TEAM_ABBREV_FIXES)
 
+# Every raw alias → team: TEAM_MAP's codes as written plus their dot-free forms
+# ("L.A" and "LA"), since clean_team_name strips dots before the lookup. Keys are
+# uppercased once here and the table is read-only after import.
+TEAM_ALIASES = MappingProxyType({
+    **{code.replace(".", "").upper(): team for code, team in TEAM_MAP.items()},
+    **{code.upper(): team for code, team in TEAM_MAP.items()},
+})
+
 
 def clean_team_name(team_str):
     """
@@ -47,7 +62,45 @@ def clean_team_name(team_str):
 
     parts = [p.strip().replace('.', '') for p in str(team_str).replace('/', ',').split(',')]
     parts = [p for p in parts if p]
-    return TEAM_MAP.get(parts[-1].upper(), team_str) if parts else team_str
+    return TEAM_ALIASES.get(parts[-1].upper(), team_str) if parts else team_str
+
+
+def clean_team_names(teams):
+    """
+    Vectorized clean_team_name over a whole Team column.
+
+    Single-team codes (nearly every row) resolve with one lookup in TEAM_ALIASES;
+    the remaining distinct strings (traded players, odd spacing) are each cleaned
+    once with clean_team_name.
+
+    Args:
+        teams (pd.Series): Team strings from NST
+
+    Returns:
+        pd.Series: Normalized team names (same index as teams)
+    """
+    cleaned = teams.map(TEAM_ALIASES)
+    missed = cleaned.isna() & teams.notna()
+    if missed.any():
+        rest = teams[missed]
+        cleaned[missed] = rest.map({team: clean_team_name(team) for team in rest.unique()})
+    return cleaned
+
+
+def _read_csv_bytes(content):
+    """
+    Parse a downloaded CSV, with pyarrow's multithreaded reader when it is installed.
+
+    Columns stay NumPy-backed either way, so the numeric-dtype checks downstream
+    see the same int64/float64/object columns as the C parser produces. Files
+    pyarrow's stricter tokenizer rejects (ragged rows, stray quoting) are
+    re-read with the C parser.
+    """
+    try:
+        return pd.read_csv(BytesIO(content), engine="pyarrow")
+    except (ImportError, ValueError, pd.errors.ParserError):
+        # pyarrow.lib.ArrowInvalid subclasses ValueError
+        return pd.read_csv(BytesIO(content))
 
 
 def download_nst_stats(url, headers, dataset_name):
@@ -63,12 +116,13 @@ def download_nst_stats(url, headers, dataset_name):
         pd.DataFrame: Player stats or empty DataFrame on failure
     """
     try:
-        r = requests.get(url, headers=headers, timeout=20)
-        soup = BeautifulSoup(r.text, "html.parser")
-        csv_link = soup.find("a", string=lambda t: t and "CSV" in t)
+        r = http_session.get(url, headers=headers, timeout=20)
+        # XPath runs inside libxml2 — no Python-side walk over every anchor on the page
+        csv_links = lxml.html.fromstring(r.content).xpath('//a[contains(text(), "CSV")]/@href')
 
-        if csv_link:
-            df = pd.read_csv("https://www.naturalstattrick.com" + csv_link["href"])
+        if csv_links:
+            csv = http_session.get("https://www.naturalstattrick.com" + csv_links[0], headers=headers, timeout=20)
+            df = _read_csv_bytes(csv.content)
         else:
             df = pd.read_html(StringIO(r.text))[0]
 
@@ -80,6 +134,17 @@ def download_nst_stats(url, headers, dataset_name):
         return pd.DataFrame()
 
 
+def _numeric_block(df, cols):
+    """
+    df[cols] as a float64 array; non-numeric columns are coerced (errors → NaN), missing ones are NaN.
+    """
+    block = df.reindex(columns=cols)
+    to_coerce = [col for col in cols if not pd.api.types.is_numeric_dtype(block[col])]
+    if to_coerce:
+        block[to_coerce] = block[to_coerce].apply(pd.to_numeric, errors='coerce')
+    return block.to_numpy(dtype=np.float64)
+
+
 def merge_and_weight_stats(full_df, recent_df, recent_weight=0.70):
     """
     Merge full-season and recent stats with weighted averaging.
@@ -100,39 +165,36 @@ def merge_and_weight_stats(full_df, recent_df, recent_weight=0.70):
 
     full_weight = 1 - recent_weight
 
-    # Clean team names for both datasets
-    full_df = full_df.copy()
-    recent_df = recent_df.copy()
-    full_df["Team"] = full_df["Team"].apply(clean_team_name)
-    recent_df["Team"] = recent_df["Team"].apply(clean_team_name)
-
-    # Merge on Player + Team
-    merged = full_df.merge(
-        recent_df,
-        on=["Player", "Team"],
-        how="left",
-        suffixes=("_full", "_recent")
-    )
+    # Clean team names for both datasets; assign shares the other columns instead of copying them
+    full_df = full_df.reset_index(drop=True)
+    full_df = full_df.assign(Team=clean_team_names(full_df["Team"]))
+    recent_df = recent_df.assign(Team=clean_team_names(recent_df["Team"]))
+
+    # Recent rows with almost no ice time carry noise, not form; those players keep
+    # their full-season stats (and the lookup below has fewer rows to index)
+    if "TOI" in recent_df.columns:
+        recent_df = recent_df[pd.to_numeric(recent_df["TOI"], errors='coerce') > MIN_RECENT_TOI]
+
+    # Look recent rows up by Player + Team instead of merging; one recent row per key,
+    # so no full-season row is ever duplicated (-1 = player has no recent row)
+    recent_df = recent_df.drop_duplicates(subset=["Player", "Team"]).reset_index(drop=True)
+    recent_pos = pd.MultiIndex.from_arrays([recent_df["Player"], recent_df["Team"]]).get_indexer(
+        pd.MultiIndex.from_arrays([full_df["Player"], full_df["Team"]]))
 
     # Identify columns to keep as-is (non-numeric or special columns)
     keep_as_is = ["Player", "Team", "Position", "GP", "Games Played"]
     
-    # Identify numeric columns to weight
-    stats_to_weight = []
-    for col in full_df.columns:
-        if col not in keep_as_is:
-            # Try to convert to numeric to see if it's a stat column
-            try:
-                pd.to_numeric(full_df[col], errors='coerce')
-                if full_df[col].dtype in ['int64', 'float64'] or pd.to_numeric(full_df[col], errors='coerce').notna().any():
-                    stats_to_weight.append(col)
-            except:
-                continue
-
-    # Build weighted dataframe
-    weighted = pd.DataFrame()
-    weighted["Player"] = merged["Player"]
-    weighted["Team"] = merged["Team"]
+    # Identify numeric columns to weight: numeric dtypes straight from the metadata,
+    # other columns if any value parses as a number (coerced once per column)
+    candidates = [col for col in full_df.columns if col not in keep_as_is]
+    numeric_cols = set(full_df[candidates].select_dtypes(include=np.number).columns)
+    other_cols = [col for col in candidates if col not in numeric_cols]
+    coerced = full_df[other_cols].apply(pd.to_numeric, errors='coerce')
+    parses = coerced.notna().any()
+    stats_to_weight = [col for col in candidates if col in numeric_cols or parses.get(col, False)]
+
+    # Identity columns, collected once instead of inserted one by one
+    ids = {"Player": full_df["Player"], "Team": full_df["Team"]}
 
     # Keep GP from full season (accurate games played)
     gp_col = None
@@ -142,41 +204,127 @@ def merge_and_weight_stats(full_df, recent_df, recent_weight=0.70):
         gp_col = "Games Played"
     
     if gp_col:
-        weighted[gp_col] = merged[f"{gp_col}_full"]
+        ids[gp_col] = full_df[gp_col]
 
     # Keep Position if available
     if "Position" in full_df.columns:
-        weighted["Position"] = merged.get("Position_full", merged.get("Position"))
+        ids["Position"] = full_df["Position"]
+
+    # Weight all numeric stats as one (players, stats) block, coercing errors to NaN;
+    # players or stats missing from the recent data come back as NaN
+    # (full-season columns coerced above are reused, not parsed a second time)
+    full_vals = _numeric_block(full_df.assign(**coerced), stats_to_weight)
+    recent_vals = np.full_like(full_vals, np.nan)
+    has_recent = recent_pos >= 0
+    if has_recent.any():
+        recent_vals[has_recent] = _numeric_block(recent_df, stats_to_weight)[recent_pos[has_recent]]
+
+    # Weighted average: use recent if available, otherwise full season
+    if NUMBA_AVAILABLE:
+        blended = blend_stats(np.ascontiguousarray(full_vals), np.ascontiguousarray(recent_vals),
+                              full_weight, recent_weight)
+    else:
+        blended = np.where(
+            np.isnan(recent_vals),
+            full_vals,
+            full_vals * full_weight + recent_vals * recent_weight
+        )
 
-    # Weight all numeric stats
-    for stat in stats_to_weight:
-        full_col = f"{stat}_full"
-        recent_col = f"{stat}_recent"
+    return pd.concat(
+        [pd.DataFrame(ids), pd.DataFrame(blended, columns=stats_to_weight, index=full_df.index)],
+        axis=1
+    )
 
-        # Convert to numeric, coercing errors to NaN
-        full_vals = pd.to_numeric(merged[full_col], errors='coerce')
-        recent_vals = pd.to_numeric(merged.get(recent_col, pd.Series([np.nan] * len(merged))), errors='coerce')
 
-        # Weighted average: use recent if available, otherwise full season
-        weighted[stat] = full_vals.where(
-            recent_vals.isna(),
-            full_vals * full_weight + recent_vals * recent_weight
-        )
+def _sqlite_type(dtype):
+    """
+    SQLite column affinity for a pandas dtype (the same mapping DataFrame.to_sql uses).
+    """
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL"
+    return "TEXT"
+
 
-    return weighted
+def write_players_table(conn, df):
+    """
+    Replace the players table with df in one prepared bulk insert.
 
+    Skips DataFrame.to_sql's per-row conversion layer; NaN values are stored as NULL.
 
-def download_nst_data(db_path, recent_weight=0.70):
+    Args:
+        conn (sqlite3.Connection): Open database connection (caller commits)
+        df (pd.DataFrame): Player rows to store
+    """
+    cols = [str(c) for c in df.columns]
+    quoted = ['"' + c.replace('"', '""') + '"' for c in cols]
+    conn.execute("DROP TABLE IF EXISTS players")
+    conn.execute("CREATE TABLE players (" + ", ".join(
+        f"{q} {_sqlite_type(dtype)}" for q, dtype in zip(quoted, df.dtypes)) + ")")
+    conn.executemany(
+        f"INSERT INTO players VALUES ({', '.join('?' * len(cols))})",
+        # Column-wise tolist() yields plain Python values far faster than row iteration
+        zip(*(df[c].tolist() for c in df.columns))
+    )
+
+
+def load_cached_nst_data(db_path, recent_weight, max_age_hours=NST_CACHE_HOURS):
+    """
+    Return the saved player table if it is fresh enough to skip the NST download.
+
+    The cache is valid when the meta table matches SCHEMA_VERSION, recent_weight and
+    MIN_TOI_MINUTES (baked into team_agg) and MIN_RECENT_TOI, and the data was fetched less than max_age_hours ago.
+
+    Args:
+        db_path (str): Path to SQLite database file
+        recent_weight (float): Weight the cached data must have been built with
+        max_age_hours (float): Maximum age of the cached download
+
+    Returns:
+        pd.DataFrame or None: Cached player data, or None if it must be re-downloaded
+    """
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    except sqlite3.Error:
+        return None
+
+    try:
+        meta = dict(conn.execute("SELECT k, v FROM meta").fetchall())
+        if (meta.get("schema") != str(SCHEMA_VERSION)
+                or meta.get("recent_weight") != str(recent_weight)
+                or meta.get("min_toi") != str(MIN_TOI_MINUTES)
+                or meta.get("min_recent_toi") != str(MIN_RECENT_TOI)
+                or time.time() - float(meta.get("fetched_at", 0)) > max_age_hours * 3600):
+            return None
+        return pd.read_sql("SELECT * FROM players", conn)
+    except Exception:
+        return None
+    finally:
+        conn.close()
+
+
+def download_nst_data(db_path, recent_weight=0.70, force=False):
     """
     Download live player stats from Natural Stat Trick with recent form weighting.
 
+    Skips the download when the database already holds a fresh copy built with
+    the same SCHEMA_VERSION and recent_weight (see load_cached_nst_data).
+
     Args:
         db_path (str): Path to SQLite database file
         recent_weight (float): Weight for last 10 games (0-1), default 0.70
+        force (bool): Re-download even if the cached data is fresh
 
     Returns:
         pd.DataFrame: Weighted player data (skaters + goalies)
     """
+    if not force:
+        cached = load_cached_nst_data(db_path, recent_weight)
+        if cached is not None:
+            print(f"Using cached player stats from {db_path} ({len(cached)} players)")
+            return cached
+
     print(f"Downloading live 2025-26 player stats from Natural Stat Trick...")
     print(f"   Weighting: {recent_weight:.0%} recent form, {(1-recent_weight):.0%} full season")
 
@@ -190,11 +338,16 @@ def download_nst_data(db_path, recent_weight=0.70):
     skaters_recent_url = "https://www.naturalstattrick.com/playerteams.php?fromseason=20252026&thruseason=20252026&stype=2&sit=5v5&score=all&stdoi=oi&rate=n&team=ALL&pos=S&loc=B&toi=0&gpfilt=gpteam&fd=&td=&tgp=10&lines=single&draftteam=ALL"
     goalies_recent_url = "https://www.naturalstattrick.com/playerteams.php?fromseason=20252026&thruseason=20252026&stype=2&sit=5v5&score=all&stdoi=g&rate=n&team=ALL&pos=S&loc=B&toi=0&gpfilt=gpteam&fd=&td=&tgp=10&lines=single&draftteam=ALL"
 
-    # Download all datasets
-    skaters_full = download_nst_stats(skaters_full_url, headers, "Full season skaters")
-    goalies_full = download_nst_stats(goalies_full_url, headers, "Full season goalies")
-    skaters_recent = download_nst_stats(skaters_recent_url, headers, "Last 10 games skaters")
-    goalies_recent = download_nst_stats(goalies_recent_url, headers, "Last 10 games goalies")
+    # Download all datasets concurrently (network-bound, so threads are enough)
+    datasets = [
+        (skaters_full_url, "Full season skaters"),
+        (goalies_full_url, "Full season goalies"),
+        (skaters_recent_url, "Last 10 games skaters"),
+        (goalies_recent_url, "Last 10 games goalies"),
+    ]
+    with ThreadPoolExecutor(max_workers=len(datasets)) as ex:
+        futures = [ex.submit(download_nst_stats, url, headers, name) for url, name in datasets]
+        skaters_full, goalies_full, skaters_recent, goalies_recent = [f.result() for f in futures]
 
     # Check if we got any data
     if skaters_full.empty and goalies_full.empty:
@@ -211,12 +364,30 @@ def download_nst_data(db_path, recent_weight=0.70):
 
     if not all_players.empty:
         conn = sqlite3.connect(db_path)
-        all_players.to_sql("players", conn, if_exists="replace", index=False)
+        # WAL lets readers keep going while the table is rewritten
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        # Explicit BEGIN: sqlite3 would otherwise autocommit the DROP/CREATE statements
+        conn.execute("BEGIN")
+        write_players_table(conn, all_players)
+        create_team_agg_table(conn)
+        conn.execute("CREATE TABLE IF NOT EXISTS meta(k TEXT PRIMARY KEY, v TEXT)")
+        conn.executemany(
+            "INSERT OR REPLACE INTO meta(k, v) VALUES (?, ?)",
+            [("schema", str(SCHEMA_VERSION)), ("recent_weight", str(recent_weight)),
+             ("min_toi", str(MIN_TOI_MINUTES)), ("min_recent_toi", str(MIN_RECENT_TOI)),
+             ("fetched_at", str(time.time()))]
+        )
+        conn.commit()
         conn.close()
         print(f"   ✓ Success: {len(all_players)} weighted players saved to {db_path}")
 
     return all_players
 
+# Stat columns shown by view_team_rosters, in display order
+ROSTER_STAT_COLS = ["GP", "TOI", "xGF", "xGA", "GAA"]
+
+
 def view_team_rosters(db_path, min_toi=None):
     """
     Display individual player stats organized by team.
@@ -230,7 +401,13 @@ def view_team_rosters(db_path, min_toi=None):
     
     try:
         conn = sqlite3.connect(db_path)
-        df = pd.read_sql("SELECT * FROM players", conn)
+        # Only the columns the report shows, out of every weighted stat in the table
+        available = {row[1] for row in conn.execute("PRAGMA table_info(players)")}
+        cols = [col for col in ["Player", "Team"] + ROSTER_STAT_COLS if col in available]
+        if "Team" in available:
+            df = pd.read_sql("SELECT " + ", ".join(f'"{col}"' for col in cols) + " FROM players", conn)
+        else:
+            df = pd.DataFrame()
         conn.close()
     except Exception as e:
         print(f"   ✗ Could not load player data: {e}")
@@ -244,42 +421,28 @@ def view_team_rosters(db_path, min_toi=None):
     print("PLAYER STATS BY TEAM (Weighted: 70% Recent Form, 30% Full Season)")
     print("=" * 120)
     
-    # Group by team
-    for team in sorted(df["Team"].unique()):
-        team_players = df[df["Team"] == team].copy()
-        
-        # Filter by TOI if column exists
-        if "TOI" in team_players.columns:
-            team_players = team_players[team_players["TOI"] > min_toi]
-        
-        if team_players.empty:
-            continue
-            
+    # Filter by TOI if column exists (once, for every team)
+    if "TOI" in df.columns:
+        df = df[df["TOI"] > min_toi]
+
+    # Select key columns to display, in order of priority
+    display_cols = ["Player"] + [col for col in ROSTER_STAT_COLS if col in df.columns]
+
+    # Sort by xGF descending (most ice time first); groupby keeps this order within each team
+    if "xGF" in df.columns:
+        df = df.sort_values("xGF", ascending=False)
+
+    # Format numeric columns to 2 decimal places
+    display_df = df[display_cols].copy()
+    numeric_cols = display_df[display_cols[1:]].select_dtypes(include="number").columns
+    display_df[numeric_cols] = display_df[numeric_cols].round(2)
+
+    # One hashed partition by team: row positions per team, taken with iloc
+    team_indices = df.groupby("Team", sort=True).indices
+    for team in sorted(team_indices):
         print(f"\n{team}")
         print("-" * 120)
-        
-        # Select key columns to display
-        display_cols = ["Player"]
-        
-        # Add available stat columns in order of priority
-        priority_cols = ["GP", "TOI", "xGF", "xGA", "GAA"]
-        for col in priority_cols:
-            if col in team_players.columns:
-                display_cols.append(col)
-        
-        # Sort by xGF descending (most ice time first)
-        if "xGF" in team_players.columns:
-            team_players = team_players.sort_values("xGF", ascending=False)
-        
-        # Display the stats
-        display_df = team_players[display_cols].copy()
-        
-        # Format numeric columns to 2 decimal places
-        for col in display_df.columns:
-            if col != "Player" and pd.api.types.is_numeric_dtype(display_df[col]):
-                display_df[col] = display_df[col].round(2)
-        
-        print(display_df.to_string(index=False))
+        print(display_df.iloc[team_indices[team]].to_string(index=False))
         
         print()  # Extra line between teams
     
@@ -1,8 +1,13 @@
 # nhl_schedule.py
+import os
+import time
+from datetime import timedelta
+import numpy as np
 import pandas as pd
-import requests
-from bs4 import BeautifulSoup
-from config import SEASON_CODE, CURRENT_SEASON_FULL
+from io import StringIO
+import http_session
+from config import (SEASON_CODE, CURRENT_SEASON_FULL, TODAY, TODAY_STR, SCHEDULE_CACHE_HOURS,
+                    SCHEDULE_RESULT_DAYS, HOCKEY_REFERENCE_DELAY)
 
 # Forward mapping: code → full name
 TEAM_MAP = {
@@ -29,70 +34,178 @@ NAME_TO_CODE = {v: k for k, v in TEAM_MAP.items()}
 # NST dotted versions → clean code
 NST_DOTS = {"L.A": "LAK", "N.J": "NJD", "S.J": "SJS", "T.B": "TBL"}
 
+# Compact schedule dtypes: goals fit int16, and team / result columns have a fixed, tiny vocabulary
+TEAM_DTYPE = pd.CategoricalDtype(sorted(TEAM_MAP.values()))
+CODE_DTYPE = pd.CategoricalDtype(sorted(TEAM_MAP))
+OT_DTYPE = pd.CategoricalDtype(["", "OT", "SO"])
 
-def scrape_schedule(output_path=None):
-    url = f"https://www.hockey-reference.com/leagues/NHL_{SEASON_CODE}_games.html"
-    print(f"Scraping {CURRENT_SEASON_FULL} schedule from Hockey-Reference...")
 
-    headers = {"User-Agent": "Mozilla/5.0"}
-    r = requests.get(url, headers=headers, timeout=30)
-    r.raise_for_status()
+def _compact_schedule(df):
+    """
+    Cast schedule columns to the compact dtypes above (the CSV cache reads back as int64/object).
+    """
+    dtypes = {"visitor": TEAM_DTYPE, "home": TEAM_DTYPE, "visitor_code": CODE_DTYPE,
+              "home_code": CODE_DTYPE, "vg": np.int16, "hg": np.int16, "ot": OT_DTYPE}
+    return df.astype({col: dtype for col, dtype in dtypes.items() if col in df.columns})
+
+
+def _parquet_path(csv_path):
+    """
+    Path of the Parquet sibling written next to a schedule CSV.
+    """
+    return os.path.splitext(csv_path)[0] + ".parquet"
+
+
+def load_cached_schedule(path):
+    """
+    Load a schedule previously written by scrape_schedule.
+
+    Prefers the typed Parquet sibling when it is at least as new as the CSV,
+    falling back to parsing the CSV (e.g. when pyarrow isn't installed).
+    """
+    pq_path = _parquet_path(path)
+    if os.path.exists(pq_path) and os.path.getmtime(pq_path) >= os.path.getmtime(path):
+        try:
+            return pd.read_parquet(pq_path)
+        except (ImportError, OSError, ValueError):
+            pass
+
+    df = pd.read_csv(path, dtype={"ot": str})
+    df["ot"] = df["ot"].fillna("")
+    return _compact_schedule(df)
+
+
+def _schedule_table_html(html):
+    """
+    The <table id="schedule"> ... </table> slice of the page, or None if it can't be located.
+
+    Cutting it out with two string searches lets the parser skip the rest of the page.
+    """
+    marker = html.find('id="schedule"')
+    start = html.rfind("<table", 0, marker) if marker >= 0 else -1
+    end = html.find("</table>", marker)
+    if start < 0 or end < 0:
+        return None
+    return html[start:end + len("</table>")]
+
+
+def _read_schedule_table(html):
+    """
+    Parse the schedule <table> in C via pd.read_html, with the same fallbacks as before.
+    """
+    # Parse only the schedule table when it can be sliced out of the page
+    table_html = _schedule_table_html(html)
+    if table_html is not None:
+        try:
+            return pd.read_html(StringIO(table_html), flavor="lxml")[0]
+        except ValueError:
+            pass
 
-    soup = BeautifulSoup(r.text, "html.parser")
-    
     # Robust table finder with fallbacks
-    table = soup.find("table", {"id": "schedule"})
-    if not table:
-        table = soup.find("table", class_="stats_table")
-    if not table:
-        # Fallback: Grab the largest table (schedules have 100+ rows)
-        tables = soup.find_all("table")
-        table = next((t for t in tables if len(t.find_all("tr")) > 50), None)
-        if table:
-            print("   Debug: Using fallback table (largest one found).")
-    if not table:
+    for attrs in ({"id": "schedule"}, {"class": "stats_table"}):
+        try:
+            return pd.read_html(StringIO(html), attrs=attrs, flavor="lxml")[0]
+        except ValueError:
+            continue
+
+    # Fallback: Grab the first big table (schedules have 100+ rows)
+    try:
+        tables = pd.read_html(StringIO(html), flavor="lxml")
+    except ValueError:
+        tables = []
+    table = next((t for t in tables if len(t) > 50), None)
+    if table is None:
         raise RuntimeError("Schedule table not found — page may be loading dynamically or layout changed.")
+    print("   Debug: Using fallback table (largest one found).")
+    return table
 
-    games = []
-    for row in table.find_all("tr")[1:]:
-        cells = row.find_all(["th", "td"])
-        if len(cells) < 8:
-            continue
 
-        date_cell = cells[0].get_text(strip=True)
-        if not date_cell or "-" not in date_cell:
-            continue
-        date_str = date_cell[:10]
+def _parse_schedule_table(html):
+    """
+    Turn the Hockey-Reference games table into the schedule frame, column-wise.
 
-        raw_visitor = cells[2].get_text(strip=True)
-        raw_home = cells[4].get_text(strip=True)
+    Args:
+        html (str): Schedule page HTML
 
-        # Clean, reliable mapping — no more Columbus bugs!
-        visitor_code = NAME_TO_CODE.get(raw_visitor, raw_visitor[:3].upper())
-        home_code = NAME_TO_CODE.get(raw_home, raw_home[:3].upper())
+    Returns:
+        pd.DataFrame: date, visitor, home, visitor_code, home_code, vg, hg, ot, played (sorted by date)
+    """
+    table = _read_schedule_table(html)
+
+    # Positional columns: Date, Time, Visitor, G, Home, G, OT/SO
+    raw = table.iloc[:, :7].astype(str)
+    raw.columns = ["date", "time", "visitor", "vg", "home", "hg", "ot"]
+
+    # Drop repeated header rows and blank spacer rows
+    raw = raw[raw["date"].str.contains("-", regex=False)]
+
+    # Clean, reliable mapping — no more Columbus bugs!
+    visitor_code = raw["visitor"].map(NAME_TO_CODE).fillna(raw["visitor"].str[:3].str.upper())
+    home_code = raw["home"].map(NAME_TO_CODE).fillna(raw["home"].str[:3].str.upper())
+    unknown = sorted(set(visitor_code[~visitor_code.isin(TEAM_MAP)]) | set(home_code[~home_code.isin(TEAM_MAP)]))
+    if unknown:
+        raise KeyError(f"Unknown team codes in schedule: {unknown}")
+
+    vg = pd.to_numeric(raw["vg"], errors="coerce")
+    hg = pd.to_numeric(raw["hg"], errors="coerce")
+    # A game is played once both score cells are filled in (shutouts score 0)
+    played = vg.notna() & hg.notna()
+    vg, hg = vg.fillna(0).astype(int), hg.fillna(0).astype(int)
+
+    df = pd.DataFrame({
+        "date": raw["date"].str[:10],
+        "visitor": visitor_code.map(TEAM_MAP),
+        "home": home_code.map(TEAM_MAP),
+        "visitor_code": visitor_code,
+        "home_code": home_code,
+        "vg": vg, "hg": hg,
+        "ot": raw["ot"].where(raw["ot"].isin(["OT", "SO"]), ""),
+        "played": played,
+    })
+    return _compact_schedule(df.sort_values("date").reset_index(drop=True))
+
+
+def scrape_schedule(output_path=None, force_cache=False, max_age_hours=SCHEDULE_CACHE_HOURS):
+    """
+    Scrape the season schedule from Hockey-Reference, reusing output_path when it is fresh.
 
-        visitor = TEAM_MAP[visitor_code]
-        home = TEAM_MAP[home_code]
+    The cached CSV is reused if it is younger than max_age_hours and no game from
+    the last SCHEDULE_RESULT_DAYS days is still without a result (it has likely
+    come in since). Older unplayed games are postponements and don't count.
 
-        vg = int(cells[3].get_text(strip=True) or 0)
-        hg = int(cells[5].get_text(strip=True) or 0)
-        ot = cells[6].get_text(strip=True)
-        ot = ot if ot in ["OT", "SO"] else ""
-        played = vg > 0 and hg > 0
+    Args:
+        output_path (str, optional): CSV path to write (and reuse as the cache)
+        force_cache (bool): Reuse an existing CSV regardless of age or staleness
+        max_age_hours (float): Maximum cache age before re-scraping
+
+    Returns:
+        pd.DataFrame: Full schedule
+    """
+    if output_path and os.path.exists(output_path):
+        age_hours = (time.time() - os.path.getmtime(output_path)) / 3600
+        if force_cache or age_hours < max_age_hours:
+            cached = load_cached_schedule(output_path)
+            window_start = (TODAY - timedelta(days=SCHEDULE_RESULT_DAYS)).strftime("%Y-%m-%d")
+            recent = (cached["date"] >= window_start) & (cached["date"] < TODAY_STR)
+            stale = (recent & ~cached["played"]).any()
+            if force_cache or not stale:
+                print(f"   Using cached schedule ({age_hours:.1f}h old): {output_path}")
+                return cached
 
-        games.append({
-            "date": date_str,
-            "visitor": visitor,
-            "home": home,
-            "visitor_code": visitor_code,
-            "home_code": home_code,
-            "vg": vg, "hg": hg, "ot": ot, "played": played
-        })
+    url = f"https://www.hockey-reference.com/leagues/NHL_{SEASON_CODE}_games.html"
+    print(f"Scraping {CURRENT_SEASON_FULL} schedule from Hockey-Reference...")
+
+    r = http_session.get(url, min_interval=HOCKEY_REFERENCE_DELAY, timeout=30)
+    r.raise_for_status()
 
-    df = pd.DataFrame(games).sort_values("date").reset_index(drop=True)
+    df = _parse_schedule_table(r.text)
 
     if output_path:
         df.to_csv(output_path, index=False)
+        try:
+            df.to_parquet(_parquet_path(output_path), index=False)
+        except ImportError:
+            pass  # Parquet engine is optional; the CSV remains the cache
         print(f"   Success: {len(df)} games scraped ({df['played'].sum()} played)")
 
     return df
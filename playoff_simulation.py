@@ -1,7 +1,11 @@
 # playoff_simulation.py
 # NHL playoff bracket simulation logic
 
-from game_simulation import simulate_game
+import numpy as np
+from config import HOME_ICE_ADVANTAGE, LEAGUE_AVG_XG_PER_60, OT_HOME_WIN_PROB, TEAM_STRENGTH_VARIANCE
+from game_simulation import kernel_seed
+from team_strength import FALLBACK_STRENGTH
+from _sim_kernel import NUMBA_AVAILABLE, best_of_7_nb, bracket_nb
 
 # NHL Divisions (for determining conferences)
 DIVISIONS = {
@@ -15,48 +19,66 @@ DIVISIONS = {
                 "San Jose Sharks", "Seattle Kraken", "Vancouver Canucks", "Vegas Golden Knights"]
 }
 
+# Conference membership, hashed once
+EAST = frozenset(DIVISIONS["Atlantic"] + DIVISIONS["Metropolitan"])
+WEST = frozenset(DIVISIONS["Central"] + DIVISIONS["Pacific"])
 
-def best_of_7(team1, team2, home_first, db_path):
+# Games 1-7 where team1 is at home, by home_first (home ice alternates each game)
+_TEAM1_HOME = {True: np.arange(7) % 2 == 0, False: np.arange(7) % 2 == 1}
+
+
+def best_of_7(team1, team2, home_first, strengths, rng=None):
     """
     Simulate a best-of-7 playoff series.
 
+    Runs the whole series in the numba kernel when available.
+
     Args:
         team1 (str): First team (typically higher seed)
         team2 (str): Second team
         home_first (bool): Whether team1 has home ice advantage
-        db_path (str): Path to player database
+        strengths (dict): Team strengths from precompute_team_strengths
+        rng (np.random.Generator, optional): Generator to draw from
 
     Returns:
         str: Winning team name
     """
-    wins1 = wins2 = 0
-    home_turn = home_first
-
-    while wins1 < 4 and wins2 < 4:
-        winner = simulate_game(
-            team1 if home_turn else team2,
-            team2 if home_turn else team1,
-            db_path
-        )[0]
-
-        if winner == team1:
-            wins1 += 1
-        else:
-            wins2 += 1
-
-        home_turn = not home_turn
-
-    return team1 if wins1 == 4 else team2
-
-
-def simulate_playoffs(playoff_teams, final_standings, db_path):
+    if NUMBA_AVAILABLE:
+        ratings = np.array([strengths.get(team1, FALLBACK_STRENGTH), strengths.get(team2, FALLBACK_STRENGTH)])
+        winner = best_of_7_nb(
+            0, 1, home_first, ratings[:, 0], ratings[:, 1], TEAM_STRENGTH_VARIANCE, HOME_ICE_ADVANTAGE,
+            LEAGUE_AVG_XG_PER_60, OT_HOME_WIN_PROB, kernel_seed(rng)
+        )
+        return team1 if winner == 0 else team2
+
+    if rng is None:
+        rng = np.random.default_rng(kernel_seed())  # seeded from the shared generator
+
+    # All seven games drawn in one batch (same model as simulate_game): games are
+    # independent, and whoever wins 4 of the 7 is exactly whoever reaches 4 first
+    team1_home = _TEAM1_HOME[bool(home_first)]
+    (o1, d1), (o2, d2) = strengths.get(team1, FALLBACK_STRENGTH), strengths.get(team2, FALLBACK_STRENGTH)
+    ho, hd = np.where(team1_home, o1, o2), np.where(team1_home, d1, d2)
+    ao, ad = np.where(team1_home, o2, o1), np.where(team1_home, d2, d1)
+
+    # Variance factors for ho, hd, ao, ad in one draw; then both sides' goals in one Poisson call
+    f = (1 - TEAM_STRENGTH_VARIANCE) + 2 * TEAM_STRENGTH_VARIANCE * rng.random((4, 7))
+    goals = rng.poisson(np.stack([ho * f[0] * HOME_ICE_ADVANTAGE * (LEAGUE_AVG_XG_PER_60 / (ad * f[3])),
+                                  ao * f[2] * (LEAGUE_AVG_XG_PER_60 / (hd * f[1]))]))
+    home_won = (goals[0] > goals[1]) | ((goals[0] == goals[1]) & (rng.random(7) < OT_HOME_WIN_PROB))
+
+    return team1 if np.count_nonzero(home_won == team1_home) >= 4 else team2
+
+
+def simulate_playoffs(playoff_teams, final_standings, strengths, rng=None):
     """
     Simulate the full NHL playoff bracket (both conferences + Stanley Cup Final).
 
     Args:
         playoff_teams (list): List of 16 playoff team names
-        final_standings (pd.DataFrame): Final season standings (for seeding)
-        db_path (str): Path to player database
+        final_standings (pd.DataFrame): Final season standings, sorted best first (for seeding)
+        strengths (dict): Team strengths from precompute_team_strengths
+        rng (np.random.Generator, optional): Generator to draw from
 
     Returns:
         dict: Dictionary with playoff results by round
@@ -67,43 +89,66 @@ def simulate_playoffs(playoff_teams, final_standings, db_path):
                 'cup_winner': team name or None
             }
     """
+    # Final standings position of every team (higher seed = lower number), built once
+    seed = {team: i for i, team in enumerate(final_standings.team.to_numpy())}
+
+    # Split into conferences, sorted by seed
+    east = sorted((t for t in playoff_teams if t in EAST), key=seed.__getitem__)
+    west = sorted((t for t in playoff_teams if t in WEST), key=seed.__getitem__)
+
+    return simulate_bracket(east, west, seed, strengths, rng)
+
+
+def simulate_bracket(east, west, seed, strengths, rng=None):
+    """
+    Play both conference brackets and the Stanley Cup Final on already-seeded fields.
+
+    Teams may be names or integer team ids (as in the season loop), provided
+    seed and strengths are keyed the same way. With numba the whole bracket runs
+    in one fused kernel call.
+
+    Args:
+        east (list): East playoff teams, best seed first
+        west (list): West playoff teams, best seed first
+        seed (dict | np.ndarray): Final standings position per team (lower = better)
+        strengths (dict): {team: (offensive_rating, defensive_rating)}
+        rng (np.random.Generator, optional): Generator to draw from
+
+    Returns:
+        dict: Results by round, as in simulate_playoffs (cup_winner is None without two champions)
+    """
+    if NUMBA_AVAILABLE:
+        return _simulate_bracket_nb(east, west, seed, strengths, rng)
+
     results = {
         'round1': [],
         'round2': [],
         'conf_finals': [],
         'cup_winner': None
     }
-    
-    # Split into conferences
-    east = [t for t in playoff_teams if t in DIVISIONS["Atlantic"] + DIVISIONS["Metropolitan"]]
-    west = [t for t in playoff_teams if t in DIVISIONS["Central"] + DIVISIONS["Pacific"]]
-
-    # Sort by final standings position (higher seed = lower index)
-    east.sort(key=lambda x: final_standings[final_standings.team == x].index[0])
-    west.sort(key=lambda x: final_standings[final_standings.team == x].index[0])
 
     # ROUND 1 (8 teams -> 4 teams per conference)
     if len(east) >= 2:
-        east_r1 = [best_of_7(east[i], east[i+1], home_first=True, db_path=db_path)
+        east_r1 = [best_of_7(east[i], east[i+1], home_first=True, strengths=strengths, rng=rng)
                    for i in range(0, len(east), 2)]
         results['round1'].extend(east_r1)
         east = east_r1
     
     if len(west) >= 2:
-        west_r1 = [best_of_7(west[i], west[i+1], home_first=True, db_path=db_path)
+        west_r1 = [best_of_7(west[i], west[i+1], home_first=True, strengths=strengths, rng=rng)
                    for i in range(0, len(west), 2)]
         results['round1'].extend(west_r1)
         west = west_r1
 
     # ROUND 2 (4 teams -> 2 teams per conference)
     if len(east) >= 2:
-        east_r2 = [best_of_7(east[i], east[i+1], home_first=True, db_path=db_path)
+        east_r2 = [best_of_7(east[i], east[i+1], home_first=True, strengths=strengths, rng=rng)
                    for i in range(0, len(east), 2)]
         results['round2'].extend(east_r2)
         east = east_r2
     
     if len(west) >= 2:
-        west_r2 = [best_of_7(west[i], west[i+1], home_first=True, db_path=db_path)
+        west_r2 = [best_of_7(west[i], west[i+1], home_first=True, strengths=strengths, rng=rng)
                    for i in range(0, len(west), 2)]
         results['round2'].extend(west_r2)
         west = west_r2
@@ -113,24 +158,48 @@ def simulate_playoffs(playoff_teams, final_standings, db_path):
     west_champ = None
     
     if len(east) >= 2:
-        east_champ = best_of_7(east[0], east[1], home_first=True, db_path=db_path)
+        east_champ = best_of_7(east[0], east[1], home_first=True, strengths=strengths, rng=rng)
         results['conf_finals'].append(east_champ)
     elif len(east) == 1:
         east_champ = east[0]
         results['conf_finals'].append(east_champ)
     
     if len(west) >= 2:
-        west_champ = best_of_7(west[0], west[1], home_first=True, db_path=db_path)
+        west_champ = best_of_7(west[0], west[1], home_first=True, strengths=strengths, rng=rng)
         results['conf_finals'].append(west_champ)
     elif len(west) == 1:
         west_champ = west[0]
         results['conf_finals'].append(west_champ)
 
     # STANLEY CUP FINAL
-    if east_champ and west_champ:
-        home_first = final_standings[final_standings.team == east_champ].index[0] < \
-                     final_standings[final_standings.team == west_champ].index[0]
-        cup_winner = best_of_7(east_champ, west_champ, home_first, db_path)
+    if east_champ is not None and west_champ is not None:
+        home_first = seed[east_champ] < seed[west_champ]
+        cup_winner = best_of_7(east_champ, west_champ, home_first, strengths, rng)
         results['cup_winner'] = cup_winner
 
     return results
+
+
+def _simulate_bracket_nb(east, west, seed, strengths, rng=None):
+    """
+    simulate_bracket via bracket_nb: teams become indices into local rating arrays.
+    """
+    teams = list(east) + list(west)
+    ratings = np.array([strengths.get(t, FALLBACK_STRENGTH) for t in teams], dtype=np.float64).reshape(-1, 2)
+    rank = np.array([seed[t] for t in teams], dtype=np.int64)
+    ids = np.arange(len(teams), dtype=np.int64)
+
+    east_rounds, west_rounds, cup = bracket_nb(
+        ids[:len(east)], ids[len(east):], rank, ratings[:, 0], ratings[:, 1], TEAM_STRENGTH_VARIANCE,
+        HOME_ICE_ADVANTAGE, LEAGUE_AVG_XG_PER_60, OT_HOME_WIN_PROB, kernel_seed(rng)
+    )
+
+    def winners(rnd):
+        return [teams[i] for rounds in (east_rounds, west_rounds) for i in rounds[rnd] if i >= 0]
+
+    return {
+        'round1': winners(0),
+        'round2': winners(1),
+        'conf_finals': winners(2),
+        'cup_winner': teams[cup] if cup >= 0 else None
+    }
@@ -1,11 +1,18 @@
 # season_simulation.py
 # Season simulation, standings, and playoff qualification logic
 
+import os
+import numpy as np
 import pandas as pd
-from collections import defaultdict, Counter
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from tqdm import tqdm
-from game_simulation import simulate_game
-from playoff_simulation import simulate_playoffs
+from config import (HOME_ICE_ADVANTAGE, LEAGUE_AVG_XG_PER_60, OT_HOME_WIN_PROB, TEAM_STRENGTH_VARIANCE,
+                    POISSON_NORMAL_CUTOFF)
+from game_simulation import expected_goals, sample_games, spawn_rngs, kernel_seed
+from _sim_kernel import NUMBA_AVAILABLE, run_all_sims, rank_teams, qualify_playoffs
+from playoff_simulation import simulate_bracket
+from team_strength import FALLBACK_STRENGTH
 
 # NHL Divisions
 DIVISIONS = {
@@ -19,6 +26,15 @@ DIVISIONS = {
                 "San Jose Sharks", "Seattle Kraken", "Vancouver Canucks", "Vegas Golden Knights"]
 }
 
+# Team → division, for per-division grouping without filtering
+TEAM_TO_DIV = {team: div for div, teams in DIVISIONS.items() for team in teams}
+
+# Standings columns produced by the season engines, in delta-array order
+SEASON_STATS = ["points", "row", "otw", "gf", "ga"]
+
+# Simulations per vectorized NumPy block; bounds the (block, n_games) temporaries
+_SIM_BLOCK = 1000
+
 
 def build_current_standings(schedule_df):
     """
@@ -30,67 +46,224 @@ def build_current_standings(schedule_df):
     Returns:
         pd.DataFrame: Current standings with points, ROW, OTW, GF, GA
     """
-    standings = defaultdict(lambda: {"points": 0, "row": 0, "otw": 0, "gf": 0, "ga": 0, "gp": 0})
-
-    for _, g in schedule_df[schedule_df.played].iterrows():
-        h, a = g.home, g.visitor
-        standings[h]["gf"] += g.hg
-        standings[h]["ga"] += g.vg
-        standings[h]["gp"] += 1
-        standings[a]["gf"] += g.vg
-        standings[a]["ga"] += g.hg
-        standings[a]["gp"] += 1
-
-        if g.hg > g.vg and g.ot == "":
-            standings[h]["points"] += 2
-            standings[h]["row"] += 1
-        elif g.vg > g.hg and g.ot == "":
-            standings[a]["points"] += 2
-            standings[a]["row"] += 1
-        elif g.hg > g.vg:
-            standings[h]["points"] += 2
-            standings[h]["otw"] += 1
-            standings[a]["points"] += 1
-        else:
-            standings[a]["points"] += 2
-            standings[a]["otw"] += 1
-            standings[h]["points"] += 1
-
-    df = pd.DataFrame.from_dict(standings, orient="index").reset_index().rename(columns={"index": "team"})
+    played = schedule_df[schedule_df.played]
+    hg, vg = played.hg.to_numpy(), played.vg.to_numpy()
+    reg = (played.ot == "").to_numpy()
+
+    # One mask per outcome; anything else (visitor OT/SO win, or a tie) goes to the visitor in OT
+    home_reg_win = (hg > vg) & reg
+    away_reg_win = (vg > hg) & reg
+    home_ot_win = (hg > vg) & ~reg
+    away_ot_win = ~(home_reg_win | away_reg_win | home_ot_win)
+
+    # Interleave home/visitor rows so groupby(sort=False) keeps first-appearance team order
+    n = len(played)
+    per_side = pd.DataFrame({
+        "team": np.column_stack([played.home.to_numpy(), played.visitor.to_numpy()]).ravel(),
+        "points": np.column_stack([2 * (home_reg_win | home_ot_win) + away_ot_win,
+                                   2 * (away_reg_win | away_ot_win) + home_ot_win]).ravel(),
+        "row": np.column_stack([home_reg_win, away_reg_win]).ravel(),
+        "otw": np.column_stack([home_ot_win, away_ot_win]).ravel(),
+        "gf": np.column_stack([hg, vg]).ravel(),
+        "ga": np.column_stack([vg, hg]).ravel(),
+        "gp": np.ones(2 * n, dtype=np.int64),
+    })
+
+    # Season counters stay far below 2**15; team names become a categorical
+    df = per_side.groupby("team", sort=False).sum().astype(np.int16).reset_index()
     df["gf-ga"] = df["gf"] - df["ga"]
+    df["team"] = df["team"].astype("category")
     return df
 
 
-def get_playoff_teams(final_standings):
+def _to_soa(games, team_to_idx):
     """
-    Determine playoff teams from final standings.
+    Convert a schedule frame to contiguous home/away team index arrays.
 
     Args:
-        final_standings (pd.DataFrame): Final season standings
+        games (pd.DataFrame): Games with home and visitor columns
+        team_to_idx (dict): Team name -> row index
+
+    Returns:
+        tuple: (home_idx, away_idx) int32 arrays
+    """
+    home_idx = games.home.map(team_to_idx).to_numpy(dtype=np.int32)
+    away_idx = games.visitor.map(team_to_idx).to_numpy(dtype=np.int32)
+    return home_idx, away_idx
+
+
+def _strength_arrays(teams, strengths):
+    """
+    Lay team ratings out as arrays aligned with the given team order.
+
+    Ratings are float32: their noise dwarfs float32 precision, and the halved
+    width keeps the per-sim xG arrays compact.
+
+    Returns:
+        tuple: (strength_off, strength_def) float32 arrays
+    """
+    ratings = np.array([strengths.get(team, FALLBACK_STRENGTH) for team in teams], dtype=np.float32).reshape(-1, 2)
+    return ratings[:, 0], ratings[:, 1]
+
+
+def _division_index(teams):
+    """
+    Division number of each team in DIVISIONS order (0-1 East, 2-3 West), -1 if unlisted.
+    """
+    division_number = {div: d for d, div in enumerate(DIVISIONS)}
+    return np.array([division_number.get(TEAM_TO_DIV.get(team), -1) for team in teams], dtype=np.int64)
+
+
+def _season_deltas(strength_off, strength_def, home_idx, away_idx, n_sims, rng):
+    """
+    NumPy counterpart of run_season: every (sim, game) pair drawn as one tensor.
+
+    Scores for a block of simulations are sampled as (block, n_games) arrays and
+    scattered into per-team totals with a single flattened bincount per stat.
+
+    Args:
+        strength_off, strength_def (np.ndarray): Team ratings in team-index order
+        home_idx, away_idx (np.ndarray): Team index of each remaining game's home / away side
+        n_sims (int): Number of seasons to simulate
+        rng (np.random.Generator): Random generator to draw from
+
+    Returns:
+        np.ndarray: (n_sims, n_teams, 5) int32 deltas in SEASON_STATS order
+    """
+    n_teams = len(strength_off)
+    deltas = np.zeros((n_sims, n_teams, len(SEASON_STATS)), dtype=np.int32)
+    ho, hd = strength_off[home_idx], strength_def[home_idx]
+    ao, ad = strength_off[away_idx], strength_def[away_idx]
+
+    for start in range(0, n_sims, _SIM_BLOCK):
+        n = min(_SIM_BLOCK, n_sims - start)
+        home_xg, away_xg = expected_goals(ho, hd, ao, ad, rng, (n, len(home_idx)))
+        hg, ag, reg = sample_games(home_xg, away_xg, rng, approximate=True)
+
+        home_won = hg > ag
+        ot_loss = np.where(reg, 0, 1)
+        hpts = np.where(home_won, 2, ot_loss)
+        apts = np.where(home_won, ot_loss, 2)
+
+        # Flat (sim, team) slots so each stat is one bincount per side
+        offsets = np.arange(n)[:, None] * n_teams
+        home_slot = (offsets + home_idx).ravel()
+        away_slot = (offsets + away_idx).ravel()
+
+        def scatter(home_vals, away_vals):
+            totals = (np.bincount(home_slot, home_vals.ravel(), n * n_teams)
+                      + np.bincount(away_slot, away_vals.ravel(), n * n_teams))
+            return totals.reshape(n, n_teams)
+
+        block = deltas[start:start + n]
+        block[..., 0] = scatter(hpts, apts)
+        block[..., 1] = scatter(home_won & reg, ~home_won & reg)
+        block[..., 2] = scatter(home_won & ~reg, ~home_won & ~reg)
+        block[..., 3] = scatter(hg, ag)
+        block[..., 4] = scatter(ag, hg)
+
+    return deltas
+
+
+def _simulate_seasons(sim_rngs, remaining_games, current_standings, strengths, progress=False):
+    """
+    Run one season (plus playoffs) per generator in sim_rngs and tally the outcomes.
 
     Returns:
-        list: 16 playoff team names
+        np.ndarray: (6, n_teams) int32 counts in current_standings row order; rows are
+            playoff, round1, round2, conf_finals, cup, pres (see _counts_to_counters)
     """
-    playoff = []
+    # Struct-of-arrays view of the schedule and ratings, built once
+    current_standings = current_standings.reset_index(drop=True)
+    team_to_idx = {team: i for i, team in enumerate(current_standings.team)}
+    counts = np.zeros((6, len(team_to_idx)), dtype=np.int32)
+    playoff_counts, round1_counts, round2_counts, conf_finals_counts, cup_counts, pres_counts = counts
+    home_idx, away_idx = _to_soa(remaining_games, team_to_idx)
+    strength_off, strength_def = _strength_arrays(current_standings.team, strengths)
+
+    if NUMBA_AVAILABLE:
+        # Seasons, rankings, qualification and brackets all run in one parallel kernel
+        if not sim_rngs:
+            return counts
+        base = current_standings[SEASON_STATS].to_numpy(dtype=np.int32)
+        return run_all_sims(
+            base, strength_off, strength_def, home_idx, away_idx, _division_index(current_standings.team),
+            len(sim_rngs), TEAM_STRENGTH_VARIANCE, HOME_ICE_ADVANTAGE, LEAGUE_AVG_XG_PER_60, OT_HOME_WIN_PROB,
+            np.array([kernel_seed(rng) for rng in sim_rngs], dtype=np.uint32), POISSON_NORMAL_CUTOFF
+        )
+
+    # Every season's regular-season games up front as (sims, games) NumPy tensors
+    season_deltas = _season_deltas(strength_off, strength_def, home_idx, away_idx, len(sim_rngs),
+                                   np.random.default_rng(kernel_seed(sim_rngs[0]) if sim_rngs else None))
+
+    sims = tqdm(sim_rngs, desc="Season simulations", unit="sim") if progress else sim_rngs
+
+    # Final standings live in one (n_teams, 5) array per sim; no DataFrame in the loop
+    base = current_standings[SEASON_STATS].to_numpy(dtype=np.int64)
+    div_idx = _division_index(current_standings.team)
+
+    # The bracket runs on integer team ids
+    id_strengths = {i: strengths.get(team, FALLBACK_STRENGTH) for i, team in enumerate(current_standings.team)}
+    rank = np.empty(len(team_to_idx), dtype=np.int64)
+
+    for sim, rng in enumerate(sims):
+        totals = base + season_deltas[sim]
+
+        # One ranking pass reused for the Presidents' Trophy, qualification and seeding
+        order = rank_teams(totals)
+        rank[order] = np.arange(len(order))
+        qualified = qualify_playoffs(order, div_idx)
 
-    # Top 3 from each division
-    for div, teams in DIVISIONS.items():
-        div_df = final_standings[final_standings.team.isin(teams)].copy()
-        div_df = div_df.sort_values(by=["points", "row", "otw", "gf-ga", "gf"], ascending=False)
-        playoff.extend(div_df.head(3).team.tolist())
+        # President's Trophy winner
+        pres_counts[order[0]] += 1
+        playoff_counts[qualified] += 1
 
-    # Wildcards
-    remaining = final_standings[~final_standings.team.isin(playoff)].copy()
-    east = DIVISIONS["Atlantic"] + DIVISIONS["Metropolitan"]
-    west = DIVISIONS["Central"] + DIVISIONS["Pacific"]
+        # Simulate playoffs (order is already best-first) and track each round
+        east = [t for t in order if qualified[t] and div_idx[t] < 2]
+        west = [t for t in order if qualified[t] and div_idx[t] >= 2]
+        playoff_results = simulate_bracket(east, west, rank, id_strengths, rng)
 
-    playoff.extend(remaining[remaining.team.isin(east)].head(2).team.tolist())
-    playoff.extend(remaining[remaining.team.isin(west)].head(2).team.tolist())
+        # Count teams advancing through each round
+        round1_counts[playoff_results['round1']] += 1
+        round2_counts[playoff_results['round2']] += 1
+        conf_finals_counts[playoff_results['conf_finals']] += 1
 
-    return list(dict.fromkeys(playoff))[:16]  # dedup & cap at 16
+        if playoff_results['cup_winner'] is not None:
+            cup_counts[playoff_results['cup_winner']] += 1
 
+    return counts
 
-def simulate_full_season(schedule_df, current_standings, n_sims, db_path, show_progress_every=None):
+
+def _counts_to_counters(counts, teams):
+    """
+    Convert a (6, n_teams) count array into the six per-team Counters callers expect.
+    """
+    return tuple(Counter(dict(zip(teams, row.tolist()))) for row in counts)
+
+
+def simulate_chunk(n_sims, schedule_df, current_standings, strengths, seed=None):
+    """
+    Run a block of season simulations with its own seeded generator.
+
+    Designed as a worker task: every argument is picklable, so strengths travel
+    to the worker as a plain dict and no database access is needed.
+
+    Args:
+        n_sims (int): Number of simulations in this block
+        schedule_df (pd.DataFrame): Full season schedule
+        current_standings (pd.DataFrame): Current standings before simulation
+        strengths (dict): Team strengths from precompute_team_strengths
+        seed (int | np.random.SeedSequence | np.random.Generator, optional): Seed for this block
+
+    Returns:
+        np.ndarray: (6, n_teams) int32 outcome counts in current_standings row order
+    """
+    remaining_games = schedule_df[~schedule_df.played]
+    sim_rngs = np.random.default_rng(seed).spawn(n_sims)
+    return _simulate_seasons(sim_rngs, remaining_games, current_standings, strengths)
+
+
+def simulate_full_season(schedule_df, current_standings, n_sims, strengths, show_progress_every=None, n_workers=1):
     """
     Run full season Monte Carlo simulations.
 
@@ -98,74 +271,35 @@ def simulate_full_season(schedule_df, current_standings, n_sims, db_path, show_p
         schedule_df (pd.DataFrame): Full season schedule
         current_standings (pd.DataFrame): Current standings before simulation
         n_sims (int): Number of simulations to run
-        db_path (str): Path to player database
+        strengths (dict): Team strengths from precompute_team_strengths
         show_progress_every (int, optional): Print progress every N simulations
+        n_workers (int, optional): Worker processes to spread simulations over (None = all cores)
 
     Returns:
         tuple: (playoff_counter, round1_counter, round2_counter, conf_finals_counter, cup_counter, pres_counter)
     """
     remaining_games = schedule_df[~schedule_df.played]
-    all_teams = sorted(current_standings.team.unique())
-
-    playoff_counter = Counter()
-    round1_counter = Counter()
-    round2_counter = Counter()
-    conf_finals_counter = Counter()
-    cup_counter = Counter()
-    pres_counter = Counter()
+    # The numba kernel already spreads simulations over every core
+    n_workers = 1 if NUMBA_AVAILABLE else min(n_workers or os.cpu_count() or 1, n_sims)
 
     print(f"\nRunning {n_sims:,} full-season simulations on {len(remaining_games)} games...")
 
-    for sim in tqdm(range(n_sims), desc="Season simulations", unit="sim"):
-        standings = current_standings.copy(deep=True)
-
-        # Simulate remaining games
-        for _, game in remaining_games.iterrows():
-            home, away = game.home, game.visitor
-            winner, hpts, apts, hgf, agf, reg = simulate_game(home, away, db_path)
-
-            h_idx = standings[standings.team == home].index[0]
-            a_idx = standings[standings.team == away].index[0]
-
-            standings.loc[h_idx, ["points", "gf", "ga"]] += [hpts, hgf, agf]
-            standings.loc[a_idx, ["points", "gf", "ga"]] += [apts, agf, hgf]
-            if hpts == 2 and reg:
-                standings.loc[h_idx, "row"] += 1
-            if apts == 2 and reg:
-                standings.loc[a_idx, "row"] += 1
-            if hpts == 2:
-                standings.loc[h_idx, "otw"] += 1
-            if apts == 2:
-                standings.loc[a_idx, "otw"] += 1
-
-        standings["gf-ga"] = standings["gf"] - standings["ga"]
-        final = standings.sort_values(
-            by=["points", "row", "otw", "gf-ga", "gf"],
-            ascending=False
-        ).reset_index(drop=True)
+    teams = current_standings.team.tolist()
 
-        # President's Trophy winner
-        pres_counter[final.iloc[0].team] += 1
+    if n_workers <= 1:
+        # Independent random stream per simulation
+        counts = _simulate_seasons(spawn_rngs(n_sims), remaining_games, current_standings, strengths, progress=True)
+        return _counts_to_counters(counts, teams)
 
-        # Playoff teams
-        playoff_teams = get_playoff_teams(final)
-        for t in playoff_teams:
-            playoff_counter[t] += 1
+    # Shard the simulations evenly, one independent seed per worker
+    chunks = [n_sims // n_workers + (i < n_sims % n_workers) for i in range(n_workers)]
+    seeds = spawn_rngs(n_workers)
 
-        # Simulate playoffs and track each round
-        playoff_results = simulate_playoffs(playoff_teams, final, db_path)
-        
-        # Count teams advancing through each round
-        for team in playoff_results['round1']:
-            round1_counter[team] += 1
-        
-        for team in playoff_results['round2']:
-            round2_counter[team] += 1
-        
-        for team in playoff_results['conf_finals']:
-            conf_finals_counter[team] += 1
-        
-        if playoff_results['cup_winner']:
-            cup_counter[playoff_results['cup_winner']] += 1
-
-    return playoff_counter, round1_counter, round2_counter, conf_finals_counter, cup_counter, pres_counter
\ No newline at end of file
+    counts = np.zeros((6, len(teams)), dtype=np.int32)
+    with ProcessPoolExecutor(max_workers=n_workers) as ex:
+        futures = [ex.submit(simulate_chunk, n, schedule_df, current_standings, strengths, seed)
+                   for n, seed in zip(chunks, seeds)]
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Season simulations", unit="chunk"):
+            counts += future.result()
+
+    return _counts_to_counters(counts, teams)
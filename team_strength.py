@@ -1,15 +1,134 @@
 # team_strength.py
 # Team strength calculations from player xGF/xGA data
 
-import pandas as pd
+import functools
+import os
 import sqlite3
 from config import MIN_TOI_MINUTES, FALLBACK_OFFENSIVE_RATING, FALLBACK_DEFENSIVE_RATING
 
+# Rating used for any team missing from the player database
+FALLBACK_STRENGTH = (FALLBACK_OFFENSIVE_RATING, FALLBACK_DEFENSIVE_RATING)
+
+# Read-only connections, one per database path, reused for the life of the process
+_RO_CONNECTIONS = {}
+
+
+def create_team_agg_table(conn, min_toi=MIN_TOI_MINUTES):
+    """
+    (Re)build team_agg, the per-team ratings materialized from the players table.
+
+    The TOI filter, per-60 rates, sanity clamp and rounding are applied once when
+    the players table is written, in the same transaction, so lookups are a
+    primary-key fetch on team_agg instead of an aggregation over players.
+
+    Args:
+        conn (sqlite3.Connection): Writable connection to the player database
+        min_toi (float): Minimum player TOI baked into the table
+    """
+    # Databases written before team_agg was materialized hold it as a view
+    for (kind,) in conn.execute("SELECT type FROM sqlite_master WHERE name = 'team_agg'").fetchall():
+        conn.execute(f"DROP {kind.upper()} team_agg")
+    conn.execute("""
+        CREATE TABLE team_agg (
+            Team TEXT PRIMARY KEY,
+            off_rating REAL,
+            def_rating REAL
+        ) WITHOUT ROWID
+    """)
+    conn.execute(f'''
+        INSERT INTO team_agg (Team, off_rating, def_rating)
+        SELECT
+            Team,
+            ROUND(MAX(1.8, MIN(SUM("xGF") / (SUM("TOI") / 60.0), 4.8)), 3),
+            ROUND(MAX(1.8, MIN(SUM("xGA") / (SUM("TOI") / 60.0), 4.8)), 3)
+        FROM players
+        WHERE "TOI" > {float(min_toi)} AND Team IS NOT NULL
+        GROUP BY Team
+        HAVING SUM("TOI") > 0
+    ''')
+
+
+def _open_ro(db_path):
+    """
+    Open (or reuse) a read-only, memory-mapped connection to the player database.
+
+    Read-only URI connections never take a write lock, so any number of processes
+    can read concurrently; mmap lets SQLite serve pages straight from the OS cache.
+
+    Args:
+        db_path (str): Path to SQLite database with player stats
+
+    Returns:
+        sqlite3.Connection: Shared connection (do not close)
+    """
+    conn = _RO_CONNECTIONS.get(db_path)
+    if conn is None:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro&cache=shared", uri=True, check_same_thread=False)
+        conn.execute("PRAGMA mmap_size=268435456")
+        _RO_CONNECTIONS[db_path] = conn
+    return conn
+
+
+@functools.lru_cache(maxsize=64)
+def _get_team_strength_cached(team, db_path, version):
+    """
+    Memoized team_agg lookup; the file version is part of the key so a
+    rewritten database misses the cache instead of serving stale ratings.
+
+    Args:
+        team (str): Team name
+        db_path (str): Path to SQLite database with player stats
+        version (tuple): _db_version(db_path) when the lookup was made
+
+    Returns:
+        tuple: (offensive_rating, defensive_rating) as xGF/60 and xGA/60
+    """
+    # Missing DB or missing team_agg table both surface as OperationalError
+    try:
+        row = _open_ro(db_path).execute(
+            "SELECT off_rating, def_rating FROM team_agg WHERE Team = ?", (team,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return FALLBACK_OFFENSIVE_RATING, FALLBACK_DEFENSIVE_RATING
+
+    # FINAL SAFETY NET — team has no players above the TOI filter
+    if row is None or row[0] is None or row[1] is None:
+        return FALLBACK_OFFENSIVE_RATING, FALLBACK_DEFENSIVE_RATING
+
+    return row[0], row[1]
+
+
+def _db_version(db_path):
+    """
+    Modification times of the database file and its write-ahead log.
+
+    download_nst_data writes in WAL mode, and until a checkpoint runs new rows sit
+    in the -wal file while the main file's mtime stays put, so both are needed.
+
+    Args:
+        db_path (str): Path to SQLite database with player stats
+
+    Returns:
+        tuple: (db mtime_ns, wal mtime_ns or None)
+
+    Raises:
+        OSError: If db_path does not exist
+    """
+    mtime = os.stat(db_path).st_mtime_ns
+    try:
+        wal_mtime = os.stat(db_path + "-wal").st_mtime_ns
+    except OSError:
+        wal_mtime = None
+    return mtime, wal_mtime
+
 
 def get_team_strength(team, db_path):
     """
     Calculate team offensive and defensive strength from player data.
 
+    Results are memoized per (team, db_path, database and WAL mtimes), so repeat
+    calls skip SQLite entirely and a refreshed database is picked up automatically.
+
     Args:
         team (str): Team name
         db_path (str): Path to SQLite database with player stats
@@ -17,49 +136,65 @@ def get_team_strength(team, db_path):
     Returns:
         tuple: (offensive_rating, defensive_rating) as xGF/60 and xGA/60
     """
-    # Early exit if DB doesn't exist
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='players'")
-        if not cursor.fetchone():
-            conn.close()
-            return FALLBACK_OFFENSIVE_RATING, FALLBACK_DEFENSIVE_RATING
-    except:
+        version = _db_version(db_path)
+    except OSError:
         return FALLBACK_OFFENSIVE_RATING, FALLBACK_DEFENSIVE_RATING
+    return _get_team_strength_cached(team, db_path, version)
 
-    query = '''
-        SELECT
-            COALESCE(SUM("xGF"), 0) as total_xgf,
-            COALESCE(SUM("TOI"), 0) as total_toi,
-            COALESCE(SUM("xGA"), 0) as total_xga
-        FROM players
-        WHERE Team = ? AND "TOI" > ?
-    '''
 
-    try:
-        df = pd.read_sql(query, conn, params=(team, MIN_TOI_MINUTES))
-        conn.close()
-    except:
+def clear_team_strength_cache():
+    """
+    Drop memoized team strengths and cached connections so the next lookup
+    re-reads the player database.
+    """
+    _get_team_strength_cached.cache_clear()
+    for conn in _RO_CONNECTIONS.values():
         conn.close()
-        return FALLBACK_OFFENSIVE_RATING, FALLBACK_DEFENSIVE_RATING
+    _RO_CONNECTIONS.clear()
 
-    if df.empty:
-        return FALLBACK_OFFENSIVE_RATING, FALLBACK_DEFENSIVE_RATING
 
-    row = df.iloc[0]
-    toi = row.total_toi
+def get_team_strengths(teams, db_path):
+    """
+    Look up offensive and defensive strength for many teams with one query.
 
-    # FINAL SAFETY NET — if TOI is 0 or None, fallback
-    if not toi or toi <= 0:
-        return FALLBACK_OFFENSIVE_RATING, FALLBACK_DEFENSIVE_RATING
+    Same ratings as get_team_strength: a single `WHERE Team IN (...)` select on
+    team_agg replaces one SQLite round-trip per team.
+
+    Args:
+        teams (list | None): Team names to rate (None = every team in the table)
+        db_path (str): Path to SQLite database with player stats
+
+    Returns:
+        dict: {team: (offensive_rating, defensive_rating)}; teams without usable data are omitted,
+              so look up with strengths.get(team, FALLBACK_STRENGTH)
+    """
+    query = "SELECT Team, off_rating, def_rating FROM team_agg"
+    params = []
+    if teams is not None:
+        teams = list(teams)
+        if not teams:
+            return {}
+        query += " WHERE Team IN (" + ",".join("?" * len(teams)) + ")"
+        params += teams
 
-    # Safe calculations
-    off = row.total_xgf / (toi / 60.0)
-    def_ = row.total_xga / (toi / 60.0)
+    try:
+        rows = _open_ro(db_path).execute(query, params).fetchall()
+    except sqlite3.Error:
+        return {}
+
+    return {team: (float(o), float(d)) for team, o, d in rows if o is not None and d is not None}
 
-    # Sanity clamp
-    off = max(1.8, min(off, 4.8))
-    def_ = max(1.8, min(def_, 4.8))
 
-    return round(off, 3), round(def_, 3)
+def precompute_team_strengths(db_path, teams=None):
+    """
+    Calculate every team's offensive and defensive strength once, up front.
+
+    Args:
+        db_path (str): Path to SQLite database with player stats
+        teams (list, optional): Restrict to these teams (default: every team in the table)
+
+    Returns:
+        dict: {team: (offensive_rating, defensive_rating)}, see get_team_strengths
+    """
+    return get_team_strengths(teams, db_path)